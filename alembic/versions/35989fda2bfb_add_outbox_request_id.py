@@ -0,0 +1,33 @@
+"""Add outbox request id
+
+Revision ID: 35989fda2bfb
+Revises: 06b2d5a35b1c
+Create Date: 2026-10-19 10:12:41.482913
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "35989fda2bfb"
+down_revision: Union[str, Sequence[str], None] = "06b2d5a35b1c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "outbox_messages",
+        sa.Column("request_id", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("outbox_messages", "request_id")
@@ -0,0 +1,48 @@
+"""Add handled message entity and version
+
+Revision ID: 5c1e7a9d3f20
+Revises: 35989fda2bfb
+Create Date: 2026-10-19 14:03:17.215804
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+import sqlmodel
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c1e7a9d3f20"
+down_revision: Union[str, Sequence[str], None] = "35989fda2bfb"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        "handled_messages",
+        sa.Column("entity", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    )
+    op.add_column(
+        "handled_messages",
+        sa.Column("version", sa.Integer(), nullable=True),
+    )
+    op.create_index(
+        "ix_handled_messages_entity_handler_name_version",
+        "handled_messages",
+        ["entity", "handler_name", "version"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_handled_messages_entity_handler_name_version",
+        table_name="handled_messages",
+    )
+    op.drop_column("handled_messages", "version")
+    op.drop_column("handled_messages", "entity")
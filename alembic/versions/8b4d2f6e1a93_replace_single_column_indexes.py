@@ -0,0 +1,69 @@
+"""Replace single-column indexes
+
+Revision ID: 8b4d2f6e1a93
+Revises: 5c1e7a9d3f20
+Create Date: 2026-10-19 15:21:44.903127
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8b4d2f6e1a93"
+down_revision: Union[str, Sequence[str], None] = "5c1e7a9d3f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes no query reads through. Every insert, update and delete on these
+# tables still has to maintain them.
+UNUSED_INDEXES = {
+    "topics": [
+        "created_at",
+        "discarded",
+        "is_public",
+        "locale",
+        "updated_at",
+        "version",
+    ],
+    "users": [
+        "created_at",
+        "created_topic_count",
+        "discarded",
+        "updated_at",
+        "version",
+    ],
+    "outbox_messages": ["entity", "type", "version"],
+    "handled_messages": ["created_at"],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_topics_user_id_active",
+        "topics",
+        ["user_id"],
+        unique=False,
+        postgresql_where=sa.text("NOT discarded"),
+    )
+    op.drop_index(op.f("ix_topics_user_id"), table_name="topics")
+    for table, columns in UNUSED_INDEXES.items():
+        for column in columns:
+            op.drop_index(op.f(f"ix_{table}_{column}"), table_name=table)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, columns in UNUSED_INDEXES.items():
+        for column in columns:
+            op.create_index(op.f(f"ix_{table}_{column}"), table, [column], unique=False)
+    op.create_index(op.f("ix_topics_user_id"), "topics", ["user_id"], unique=False)
+    op.drop_index(
+        "ix_topics_user_id_active",
+        table_name="topics",
+        postgresql_where=sa.text("NOT discarded"),
+    )
@@ -0,0 +1,32 @@
+"""Add topic changes index
+
+Revision ID: d4a8c2e6f019
+Revises: c7e3a1b5d842
+Create Date: 2026-10-19 18:42:06.318254
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4a8c2e6f019"
+down_revision: Union[str, Sequence[str], None] = "c7e3a1b5d842"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_topics_user_id_updated_at_id",
+        "topics",
+        ["user_id", "updated_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_topics_user_id_updated_at_id", table_name="topics")
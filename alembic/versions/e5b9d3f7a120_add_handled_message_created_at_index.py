@@ -0,0 +1,32 @@
+"""Add handled message created_at index
+
+Revision ID: e5b9d3f7a120
+Revises: d4a8c2e6f019
+Create Date: 2026-10-19 21:14:37.502118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e5b9d3f7a120"
+down_revision: Union[str, Sequence[str], None] = "d4a8c2e6f019"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_handled_messages_created_at",
+        "handled_messages",
+        ["created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_handled_messages_created_at", table_name="handled_messages")
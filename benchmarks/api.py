@@ -0,0 +1,258 @@
+import argparse
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from uuid import UUID, uuid4
+
+import httpx
+import jwt
+import uvicorn
+from cryptography.hazmat.primitives.asymmetric import ec
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.common import current_commit, summarize, write_results
+from digestify_topics.app import create_app
+from digestify_topics.auth import add_public_key, get_auth
+from digestify_topics.db import create_engine
+from digestify_topics.models import Topic, User
+from digestify_topics.queries import HTTPQueries, MockQueries
+from digestify_topics.settings import get_settings
+
+LOCALES = ["en", "de", "fr", "es", "it", "pt", "tr", "ja", "ko", "zh"]
+KEY_ID = "benchmark"
+
+
+class TokenIssuer:
+    def __init__(self) -> None:
+        self._private_key = ec.generate_private_key(ec.SECP256R1())
+        add_public_key(KEY_ID, self._private_key.public_key())
+        self._tokens: dict[UUID, str] = {}
+
+    def token(self, user_id: UUID) -> str:
+        if user_id not in self._tokens:
+            self._tokens[user_id] = jwt.encode(
+                {
+                    "sub": str(user_id),
+                    "is_anonymous": False,
+                    "exp": datetime.now(timezone.utc) + timedelta(hours=1),
+                },
+                self._private_key,
+                algorithm="ES256",
+                headers={"kid": KEY_ID},
+            )
+        return self._tokens[user_id]
+
+
+class Dataset:
+    def __init__(self) -> None:
+        self.user_ids: list[UUID] = []
+        self.topics: list[tuple[UUID, UUID]] = []  # (topic_id, owner_id)
+        self.public_topic_ids: list[UUID] = []
+        self.created_topics: list[tuple[UUID, UUID]] = []
+
+
+async def seed(
+    engine: AsyncEngine,
+    user_count: int,
+    topics_per_user: int,
+    public_ratio: float,
+) -> Dataset:
+    dataset = Dataset()
+    async with AsyncSession(engine) as session:
+        for _ in range(user_count):
+            # Skewed library sizes: a few users own most of the topics.
+            topic_count = min(
+                int(random.paretovariate(1.5) * topics_per_user / 3),
+                topics_per_user * 10,
+            )
+            user = User(created_topic_count=topic_count)
+            user.increment_version()
+            session.add(user)
+            dataset.user_ids.append(user.id)
+            for i in range(topic_count):
+                topic = Topic(
+                    name=f"Topic {i}",
+                    description="Seeded by benchmarks.api " * 8,
+                    user_id=user.id,
+                    is_public=random.random() < public_ratio,
+                    locale=random.choice(LOCALES),
+                    image_uri=f"https://example.com/{uuid4()}.png",
+                )
+                topic.increment_version()
+                session.add(topic)
+                dataset.topics.append((topic.id, user.id))
+                if topic.is_public:
+                    dataset.public_topic_ids.append(topic.id)
+            if len(session.new) >= 1000:
+                await session.commit()
+        await session.commit()
+    return dataset
+
+
+async def cleanup(engine: AsyncEngine, dataset: Dataset) -> None:
+    async with AsyncSession(engine) as session:
+        for start in range(0, len(dataset.user_ids), 1000):
+            user_ids = dataset.user_ids[start : start + 1000]
+            await session.execute(delete(Topic).where(col(Topic.user_id).in_(user_ids)))
+            await session.execute(delete(User).where(col(User.id).in_(user_ids)))
+        await session.commit()
+
+
+Scenario = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+def scenarios(dataset: Dataset, issuer: TokenIssuer) -> dict[str, Scenario]:
+    def headers(user_id: UUID) -> dict[str, str]:
+        return {"Authorization": f"Bearer {issuer.token(user_id)}"}
+
+    async def create_topic(client: httpx.AsyncClient) -> httpx.Response:
+        user_id = random.choice(dataset.user_ids)
+        response = await client.post(
+            "/topics",
+            params={
+                "name": "Benchmark topic",
+                "description": "Created by benchmarks.api",
+                "is_public": random.random() < 0.3,
+                "locale": random.choice(LOCALES),
+                "image_uri": "https://example.com/image.png",
+            },
+            headers=headers(user_id),
+        )
+        if response.status_code == 201:
+            dataset.created_topics.append((UUID(response.json()["id"]), user_id))
+        return response
+
+    async def get_topic(client: httpx.AsyncClient) -> httpx.Response:
+        # Half own topics, half public topics of other users.
+        if dataset.public_topic_ids and random.random() < 0.5:
+            topic_id = random.choice(dataset.public_topic_ids)
+            user_id = random.choice(dataset.user_ids)
+        else:
+            topic_id, user_id = random.choice(dataset.topics)
+        return await client.get(f"/topics/{topic_id}", headers=headers(user_id))
+
+    async def my_topics(client: httpx.AsyncClient) -> httpx.Response:
+        user_id = random.choice(dataset.user_ids)
+        return await client.get("/my_topics", headers=headers(user_id))
+
+    async def me(client: httpx.AsyncClient) -> httpx.Response:
+        user_id = random.choice(dataset.user_ids)
+        return await client.get("/me", headers=headers(user_id))
+
+    async def delete_topic(client: httpx.AsyncClient) -> httpx.Response:
+        topic_id, user_id = dataset.created_topics.pop()
+        return await client.delete(f"/topics/{topic_id}", headers=headers(user_id))
+
+    # Deletes consume the topics created by the POST scenario, so order matters.
+    return {
+        "POST /topics": create_topic,
+        "GET /topics/{id}": get_topic,
+        "GET /my_topics": my_topics,
+        "GET /me": me,
+        "DELETE /topics/{id}": delete_topic,
+    }
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    concurrency: int,
+    requests: int,
+) -> dict[str, float]:
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                response = await scenario(client)
+                if response.status_code >= 400:
+                    errors += 1
+            except (httpx.HTTPError, IndexError):
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, time.perf_counter() - started)
+    summary["errors"] = errors
+    return summary
+
+
+async def main(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    engine = create_engine(settings)
+    issuer = TokenIssuer()
+
+    app = create_app()
+    # Real token verification against the benchmark key, mocked queries.
+    app.dependency_overrides.pop(get_auth, None)
+    app.dependency_overrides[HTTPQueries] = MockQueries
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning")
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    dataset = await seed(engine, args.users, args.topics_per_user, args.public_ratio)
+    print(f"Seeded {len(dataset.user_ids)} users and {len(dataset.topics)} topics")
+
+    results = []
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60
+        ) as client:
+            for concurrency in args.concurrency:
+                for name, scenario in scenarios(dataset, issuer).items():
+                    summary = await drive(client, scenario, concurrency, args.requests)
+                    print(
+                        f"{name:<22} concurrency={concurrency:>4} "
+                        f"rps={summary['throughput']:>7.0f} "
+                        f"p50={summary['p50_ms']:>7.2f}ms "
+                        f"p99={summary['p99_ms']:>7.2f}ms "
+                        f"errors={summary['errors']:.0f}"
+                    )
+                    results.append(
+                        {"endpoint": name, "concurrency": concurrency, **summary}
+                    )
+    finally:
+        server.should_exit = True
+        await server_task
+        await cleanup(engine, dataset)
+        await engine.dispose()
+
+    write_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "created_at": datetime.now(timezone.utc),
+            "users": len(dataset.user_ids),
+            "topics": len(dataset.topics),
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive the HTTP API at fixed concurrency levels."
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--topics-per-user", type=int, default=20)
+    parser.add_argument("--public-ratio", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
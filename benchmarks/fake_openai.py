@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+
+class FakeOpenAI:
+    def __init__(
+        self,
+        latency_ms: float = 50,
+        jitter_ms: float = 20,
+        rate_limit_ratio: float = 0.0,
+        dimensions: int = 768,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.dimensions = dimensions
+        self.requests = 0
+        self.rate_limited = 0
+        self._runner: web.AppRunner | None = None
+
+    async def _delay(self) -> None:
+        latency = max(0.0, random.gauss(self.latency_ms, self.jitter_ms))
+        await asyncio.sleep(latency / 1000)
+
+    def _rate_limited(self) -> web.Response | None:
+        self.requests += 1
+        if random.random() >= self.rate_limit_ratio:
+            return None
+        self.rate_limited += 1
+        return web.json_response(
+            {"error": {"message": "Rate limit reached", "type": "requests"}},
+            status=429,
+            headers={"retry-after-ms": "50"},
+        )
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        if (response := self._rate_limited()) is not None:
+            return response
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        dimensions = body.get("dimensions", self.dimensions)
+        await self._delay()
+        prompt_tokens = sum(len(str(text).split()) for text in inputs)
+        return web.json_response(
+            {
+                "object": "list",
+                "model": body["model"],
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": index,
+                        "embedding": [random.random() for _ in range(dimensions)],
+                    }
+                    for index in range(len(inputs))
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "total_tokens": prompt_tokens,
+                },
+            }
+        )
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        if (response := self._rate_limited()) is not None:
+            return response
+        body = await request.json()
+        await self._delay()
+        return web.json_response(
+            {
+                "id": f"chatcmpl-{random.getrandbits(64):x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "ok"},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 10,
+                    "completion_tokens": 1,
+                    "total_tokens": 11,
+                },
+            }
+        )
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8766) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat_completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def main(args: argparse.Namespace) -> None:
+    server = FakeOpenAI(args.latency_ms, args.jitter_ms, args.rate_limit_ratio)
+    url = await server.start(args.host, args.port)
+    print(f"Fake OpenAI listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve fake OpenAI embeddings and chat completions."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import random
+import time
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, delete, not_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.common import current_commit, summarize, write_results
+from digestify_topics.db import create_engine
+from digestify_topics.messages import TopicCreated, TopicDeleted
+from digestify_topics.models import OutboxMessage, Topic, User
+from digestify_topics.settings import get_settings
+
+TABLES = ["topics", "users", "outbox_messages", "handled_messages"]
+
+
+class Workload:
+    def __init__(self, user_ids: list[UUID]) -> None:
+        self.user_ids = user_ids
+        self.topics: list[tuple[UUID, UUID]] = []  # (topic_id, owner_id)
+
+
+async def seed(engine: AsyncEngine, user_count: int) -> Workload:
+    async with AsyncSession(engine) as session:
+        users = [User() for _ in range(user_count)]
+        for user in users:
+            user.increment_version()
+        session.add_all(users)
+        await session.commit()
+    return Workload([user.id for user in users])
+
+
+async def cleanup(engine: AsyncEngine, workload: Workload) -> None:
+    async with AsyncSession(engine) as session:
+        user_ids = workload.user_ids
+        await session.execute(delete(Topic).where(col(Topic.user_id).in_(user_ids)))
+        await session.execute(delete(User).where(col(User.id).in_(user_ids)))
+        await session.commit()
+
+
+# The operations below mirror the statements issued by the router and the
+# outbox publisher, so that index usage reflects the real query mix.
+
+
+async def create_topic(engine: AsyncEngine, workload: Workload) -> None:
+    user_id = random.choice(workload.user_ids)
+    async with AsyncSession(engine) as session:
+        user = (
+            await session.exec(select(User).where(User.id == user_id).with_for_update())
+        ).one()
+        user.created_topic_count += 1
+        user.increment_version()
+        topic = Topic(
+            name="Benchmark topic",
+            description="Created by benchmarks.indexes",
+            is_public=random.random() < 0.3,
+            locale="en",
+            user_id=user.id,
+        )
+        topic.increment_version()
+        session.add(topic)
+        session.add(
+            OutboxMessage.from_payload(
+                TopicCreated(topic_id=topic.id, user_id=user.id),
+                entity=f"topic:{topic.id}",
+                version=topic.version,
+            )
+        )
+        await session.commit()
+    workload.topics.append((topic.id, user_id))
+
+
+async def delete_topic(engine: AsyncEngine, workload: Workload) -> None:
+    if not workload.topics:
+        return await create_topic(engine, workload)
+    topic_id, user_id = workload.topics.pop(random.randrange(len(workload.topics)))
+    async with AsyncSession(engine) as session:
+        topic = (
+            await session.exec(
+                select(Topic).where(Topic.id == topic_id).with_for_update()
+            )
+        ).one()
+        user = (
+            await session.exec(select(User).where(User.id == user_id).with_for_update())
+        ).one()
+        user.created_topic_count -= 1
+        user.increment_version()
+        topic.discarded = True
+        topic.increment_version()
+        session.add(
+            OutboxMessage.from_payload(
+                TopicDeleted(topic_id=topic.id, user_id=user.id),
+                entity=f"topic:{topic.id}",
+                version=topic.version,
+            )
+        )
+        await session.commit()
+
+
+async def publish_batch(engine: AsyncEngine, workload: Workload) -> None:
+    async with AsyncSession(engine) as session:
+        statement = (
+            select(OutboxMessage)
+            .order_by(col(OutboxMessage.created_at))
+            .limit(10)
+            .with_for_update(skip_locked=True)
+        )
+        for message in (await session.exec(statement)).all():
+            await session.delete(message)
+        await session.commit()
+
+
+async def get_topic(engine: AsyncEngine, workload: Workload) -> None:
+    if not workload.topics:
+        return
+    topic_id, _ = random.choice(workload.topics)
+    async with AsyncSession(engine) as session:
+        (await session.exec(select(Topic).where(Topic.id == topic_id))).one_or_none()
+
+
+async def my_topics(engine: AsyncEngine, workload: Workload) -> None:
+    user_id = random.choice(workload.user_ids)
+    async with AsyncSession(engine) as session:
+        (await session.exec(select(User).where(User.id == user_id))).one()
+        statement = select(Topic).where(Topic.user_id == user_id, not_(Topic.discarded))
+        (await session.exec(statement)).all()
+
+
+Operation = Callable[[AsyncEngine, Workload], Awaitable[None]]
+
+OPERATIONS: dict[str, tuple[Operation, float]] = {
+    "create_topic": (create_topic, 0.3),
+    "delete_topic": (delete_topic, 0.1),
+    "publish_batch": (publish_batch, 0.1),
+    "get_topic": (get_topic, 0.3),
+    "my_topics": (my_topics, 0.2),
+}
+
+
+async def index_stats(engine: AsyncEngine) -> dict[str, dict[str, Any]]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT s.relname, s.indexrelname, s.idx_scan,"
+                " pg_relation_size(s.indexrelid) AS size_bytes,"
+                " i.indisunique OR i.indisprimary AS is_unique"
+                " FROM pg_stat_user_indexes s"
+                " JOIN pg_index i ON i.indexrelid = s.indexrelid"
+                " WHERE s.relname = ANY(:tables)"
+            ),
+            {"tables": TABLES},
+        )
+        return {row["indexrelname"]: dict(row) for row in result.mappings()}
+
+
+async def alembic_revision(engine: AsyncEngine) -> str | None:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT version_num FROM alembic_version")
+        )
+        return result.scalar_one_or_none()
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_engine(get_settings())
+    workload = await seed(engine, args.users)
+    names = list(OPERATIONS)
+    weights = [OPERATIONS[name][1] for name in names]
+    latencies: dict[str, list[float]] = {name: [] for name in names}
+    remaining = args.operations
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            await OPERATIONS[name][0](engine, workload)
+            latencies[name].append(time.perf_counter() - started)
+
+    try:
+        before = await index_stats(engine)
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        # Statistics are reported asynchronously by each backend.
+        await asyncio.sleep(1)
+        after = await index_stats(engine)
+        revision = await alembic_revision(engine)
+    finally:
+        await cleanup(engine, workload)
+        await engine.dispose()
+
+    writes = [
+        latency
+        for name in ("create_topic", "delete_topic", "publish_batch")
+        for latency in latencies[name]
+    ]
+    operations = {
+        name: summarize(values, elapsed) for name, values in latencies.items()
+    }
+    indexes = []
+    for name, stats in sorted(after.items()):
+        scans = stats["idx_scan"] - before.get(name, {}).get("idx_scan", 0)
+        indexes.append({**stats, "idx_scan": scans})
+    unused = [
+        index["indexrelname"]
+        for index in indexes
+        if index["idx_scan"] == 0 and not index["is_unique"]
+    ]
+
+    print(f"Writes: {summarize(writes, elapsed)['throughput']:.0f}/s")
+    for name, summary in operations.items():
+        print(
+            f"  {name:<14} rps={summary['throughput']:>7.0f} "
+            f"p50={summary['p50_ms']:>7.2f}ms p99={summary['p99_ms']:>7.2f}ms"
+        )
+    print("Index scans during the run:")
+    for index in indexes:
+        print(
+            f"  {index['relname']:<18} {index['indexrelname']:<48} "
+            f"scans={index['idx_scan']:>8} size={index['size_bytes'] / 1024:>8.0f}kB"
+        )
+    if unused:
+        print(f"Unused indexes: {', '.join(unused)}")
+
+    write_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "alembic_revision": revision,
+            "created_at": datetime.now(timezone.utc),
+            "concurrency": args.concurrency,
+            "write_throughput": summarize(writes, elapsed)["throughput"],
+            "operations": operations,
+            "indexes": indexes,
+            "unused_indexes": unused,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure write throughput of the router's and publisher's statements "
+            "and report which indexes they scan. Run it once per migration "
+            "revision to compare. Use a dedicated database: the publisher step "
+            "deletes every outbox row."
+        )
+    )
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
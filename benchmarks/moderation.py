@@ -0,0 +1,161 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+from pathlib import Path
+from typing import override
+
+from benchmarks.common import summarize, write_results
+from digestify_topics.metrics import MODERATION_LATENCY
+from digestify_topics.moderation import (
+    InMemoryVerdictCache,
+    ModerationEngine,
+    Prefilter,
+    RemoteModerator,
+    Verdict,
+)
+
+WORDS = (
+    "weekly digest of research news about climate energy space biology "
+    "startups design music football cooking history travel robotics"
+).split()
+BLOCKED_TERMS = [f"blocked{index}" for index in range(1000)]
+REVIEW_TERMS = [f"review{index}" for index in range(1000)]
+
+
+class FakeRemoteModerator(RemoteModerator):
+    def __init__(self, latency_ms: float, jitter_ms: float, flag_ratio: float) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.flag_ratio = flag_ratio
+        self.calls = 0
+
+    @override
+    async def is_flagged(self, text: str) -> bool:
+        self.calls += 1
+        latency = max(0.0, random.gauss(self.latency_ms, self.jitter_ms))
+        await asyncio.sleep(latency / 1000)
+        return random.random() < self.flag_ratio
+
+
+def make_text(kind: str) -> str:
+    name = " ".join(random.choices(WORDS, k=4)).title()
+    words = random.choices(WORDS, k=30)
+    match kind:
+        case "blocked":
+            words[random.randrange(len(words))] = random.choice(BLOCKED_TERMS)
+        case "ambiguous":
+            words[random.randrange(len(words))] = random.choice(REVIEW_TERMS)
+    return f"{name}\n{' '.join(words)}"
+
+
+def make_corpus(args: argparse.Namespace) -> list[str]:
+    kinds = random.choices(
+        ["clean", "blocked", "ambiguous"],
+        [
+            1 - args.blocked_ratio - args.ambiguous_ratio,
+            args.blocked_ratio,
+            args.ambiguous_ratio,
+        ],
+        k=args.texts,
+    )
+    corpus = [make_text(kind) for kind in kinds]
+    # Resubmissions of the same topic, which the verdict cache should answer.
+    for index in range(len(corpus)):
+        if index and random.random() < args.repeat_ratio:
+            corpus[index] = random.choice(corpus[:index])
+    return corpus
+
+
+def tier_stats() -> dict[str, dict[str, float]]:
+    # Count and mean latency per deciding tier, from the engine's own metric.
+    totals: dict[str, dict[str, float]] = {}
+    for metric in MODERATION_LATENCY.collect():
+        for sample in metric.samples:
+            tier = totals.setdefault(sample.labels["tier"], {"count": 0, "sum": 0})
+            if sample.name.endswith("_count"):
+                tier["count"] += sample.value
+            elif sample.name.endswith("_sum"):
+                tier["sum"] += sample.value
+    return {
+        name: {
+            "count": tier["count"],
+            "mean_ms": tier["sum"] / tier["count"] * 1000 if tier["count"] else 0.0,
+        }
+        for name, tier in totals.items()
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    started = time.perf_counter()
+    prefilter = Prefilter(BLOCKED_TERMS, REVIEW_TERMS)
+    compile_seconds = time.perf_counter() - started
+    remote = FakeRemoteModerator(args.latency_ms, args.jitter_ms, args.flag_ratio)
+    engine = ModerationEngine(
+        prefilter=prefilter,
+        cache=InMemoryVerdictCache(),
+        remote=remote,
+        timeout=args.timeout,
+        fail_open=not args.fail_closed,
+    )
+    corpus = make_corpus(args)
+
+    latencies: list[float] = []
+    verdicts: Counter[Verdict] = Counter()
+    queue = list(reversed(corpus))
+
+    async def worker() -> None:
+        while queue:
+            text = queue.pop()
+            started = time.perf_counter()
+            verdicts[await engine.check(text)] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    summary = summarize(latencies, time.perf_counter() - started)
+
+    tiers = tier_stats()
+    for name, tier in tiers.items():
+        print(f"  {name:<10} count={tier['count']:>7.0f} mean={tier['mean_ms']:.3f}ms")
+    print(
+        f"texts={summary['count']:.0f} p50={summary['p50_ms']:.3f}ms "
+        f"p99={summary['p99_ms']:.3f}ms max={summary['max_ms']:.1f}ms "
+        f"remote_calls={remote.calls} "
+        f"verdicts={ {str(key): value for key, value in verdicts.items()} }"
+    )
+    write_results(
+        args.output,
+        {
+            "terms": len(BLOCKED_TERMS) + len(REVIEW_TERMS),
+            "compile_ms": compile_seconds * 1000,
+            "remote_calls": remote.calls,
+            "remote_call_ratio": remote.calls / len(corpus) if corpus else 0.0,
+            "verdicts": {str(key): value for key, value in verdicts.items()},
+            "tiers": tiers,
+            **summary,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure topic moderation latency through the prefilter, the verdict "
+            "cache and a fake remote model. Per-tier latency is exported as the "
+            "moderation_duration_seconds metric."
+        )
+    )
+    parser.add_argument("--texts", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--blocked-ratio", type=float, default=0.02)
+    parser.add_argument("--ambiguous-ratio", type=float, default=0.1)
+    parser.add_argument("--repeat-ratio", type=float, default=0.3)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--flag-ratio", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=0.3)
+    parser.add_argument("--fail-closed", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.common import current_commit, summarize, write_results
+from digestify_topics.db import create_engine
+from digestify_topics.messages import TopicCreated
+from digestify_topics.models import OutboxMessage
+from digestify_topics.outbox_publisher import rotate_outbox_partitions
+from digestify_topics.settings import get_settings
+
+
+async def insert_messages(engine: AsyncEngine, count: int) -> None:
+    rows = [
+        OutboxMessage.from_payload(
+            TopicCreated(topic_id=uuid4(), user_id=uuid4()), version=1
+        ).model_dump(exclude={"sequence"})
+        for _ in range(count)
+    ]
+    async with AsyncSession(engine) as session:
+        await session.execute(insert(OutboxMessage).values(rows))
+        await session.commit()
+
+
+async def claim_batch(engine: AsyncEngine, batch_size: int) -> float:
+    # The publisher's claim and delete, without Redis.
+    async with AsyncSession(engine) as session:
+        started = time.perf_counter()
+        statement = (
+            select(OutboxMessage)
+            .order_by(col(OutboxMessage.sequence))
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        messages = (await session.exec(statement)).all()
+        claimed = time.perf_counter() - started
+        for message in messages:
+            await session.delete(message)
+        await session.commit()
+    return claimed
+
+
+async def table_stats(engine: AsyncEngine) -> dict[str, Any]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT count(*) AS partitions,"
+                " coalesce(sum(n_live_tup), 0) AS live_tuples,"
+                " coalesce(sum(n_dead_tup), 0) AS dead_tuples,"
+                " coalesce(sum(pg_total_relation_size(relid)), 0) AS size_bytes,"
+                " coalesce(sum(autovacuum_count), 0) AS autovacuum_count"
+                " FROM pg_stat_user_tables WHERE relname LIKE 'outbox_messages%'"
+            )
+        )
+        return {key: int(value) for key, value in result.mappings().one().items()}
+
+
+async def main(args: argparse.Namespace) -> None:
+    engine = create_engine(get_settings())
+    samples = []
+    churned = 0
+    try:
+        while churned < args.events:
+            latencies = []
+            started = time.perf_counter()
+            window_end = min(churned + args.sample_every, args.events)
+            while churned < window_end:
+                await insert_messages(engine, args.batch_size)
+                latencies.append(await claim_batch(engine, args.batch_size))
+                churned += args.batch_size
+            if args.partition_size:
+                await rotate_outbox_partitions(engine, args.partition_size)
+            summary = summarize(latencies, time.perf_counter() - started)
+            sample = {"events": churned, **summary, **await table_stats(engine)}
+            samples.append(sample)
+            print(
+                f"events={churned:>9} claim p50={summary['p50_ms']:>6.2f}ms "
+                f"p99={summary['p99_ms']:>6.2f}ms "
+                f"dead={sample['dead_tuples']:>8} "
+                f"partitions={sample['partitions']:>3}"
+            )
+    finally:
+        await engine.dispose()
+
+    write_results(
+        args.output,
+        {
+            "commit": current_commit(),
+            "batch_size": args.batch_size,
+            "partition_size": args.partition_size,
+            "samples": samples,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Push events through the outbox's insert, claim and delete cycle and "
+            "sample claim latency and dead tuples as the event count grows. Use a "
+            "dedicated database: the claims delete every outbox row."
+        )
+    )
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--sample-every", type=int, default=50_000)
+    parser.add_argument(
+        "--partition-size",
+        type=int,
+        default=0,
+        help="Rotate range partitions of this many sequence values.",
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,297 @@
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
+
+from pydantic import BaseModel
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, delete, func, insert, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.common import write_results
+from benchmarks.fake_openai import FakeOpenAI
+from digestify_topics.ai import create_embeddings, dispose_openai, initialize_openai
+from digestify_topics.db import dispose_engine, get_engine, initialize_engine
+from digestify_topics.message_dispatcher import MessageDispatcher
+from digestify_topics.messages import TopicCreated
+from digestify_topics.models import HandledMessage, OutboxMessage
+from digestify_topics.outbox_publisher import OutboxPublisher
+from digestify_topics.stream import (
+    RedisRole,
+    dispose_redis,
+    get_redis,
+    initialize_redis,
+    stream_shards,
+)
+
+STREAM = "digestify_topics_benchmark"
+ENTITY_PREFIX = "benchmark:"
+
+_handled = 0
+
+
+async def benchmark_index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+    global _handled
+    await create_embeddings([f"Topic {payload.topic_id} for user {payload.user_id}"])
+    _handled += 1
+
+
+class PipelineConfig(BaseModel):
+    publishers: int = 1
+    batch_size: int = 10
+    dispatchers: int = 1
+    shards: int = 1
+
+    @classmethod
+    def parse(cls, value: str) -> "PipelineConfig":
+        items = (item.split("=", 1) for item in value.split(",") if item)
+        return cls.model_validate({key.strip(): val for key, val in items})
+
+
+async def insert_messages(engine: AsyncEngine, count: int) -> None:
+    topic_ids = [uuid4() for _ in range(count)]
+    rows = [
+        OutboxMessage.from_payload(
+            TopicCreated(topic_id=topic_id, user_id=uuid4()),
+            entity=f"{ENTITY_PREFIX}{topic_id}",
+            version=1,
+        ).model_dump(exclude={"sequence"})
+        for topic_id in topic_ids
+    ]
+    async with AsyncSession(engine) as session:
+        await session.execute(insert(OutboxMessage).values(rows))
+        await session.commit()
+
+
+async def produce(engine: AsyncEngine, rate: float, duration: float, burst: int) -> int:
+    inserted = 0
+    if burst:
+        await insert_messages(engine, burst)
+        inserted += burst
+    started = time.monotonic()
+    while (elapsed := time.monotonic() - started) < duration:
+        count = burst + int(rate * elapsed) - inserted
+        if count > 0:
+            await insert_messages(engine, count)
+            inserted += count
+        await asyncio.sleep(0.1)
+    return inserted
+
+
+async def outbox_backlog(engine: AsyncEngine) -> int:
+    async with AsyncSession(engine) as session:
+        statement = select(func.count()).where(
+            col(OutboxMessage.entity).startswith(ENTITY_PREFIX)
+        )
+        return (await session.exec(statement)).one()
+
+
+async def stream_group(redis: Redis, streams: list[str]) -> dict[str, Any]:
+    # Summed over shards; lag is None if any shard cannot report it.
+    lag: int | None = 0
+    pending = 0
+    for stream in streams:
+        try:
+            for group in await redis.xinfo_groups(stream):
+                if group["name"].decode() == benchmark_index_topic.__name__:
+                    pending += group["pending"]
+                    lag = (
+                        None
+                        if lag is None or group.get("lag") is None
+                        else lag + group["lag"]
+                    )
+        except ResponseError:
+            return {"lag": None, "pending": None}
+    return {"lag": lag, "pending": pending}
+
+
+async def resource_snapshot(engine: AsyncEngine, redis: Redis) -> dict[str, float]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT xact_commit, tup_inserted, tup_deleted, blks_read, blks_hit"
+                " FROM pg_stat_database WHERE datname = current_database()"
+            )
+        )
+        postgres = dict(result.mappings().one())
+        outbox_size = await connection.scalar(
+            # The partitioned parent has no storage of its own.
+            text(
+                "SELECT sum(pg_total_relation_size(relid))"
+                " FROM pg_partition_tree('outbox_messages')"
+            )
+        )
+    info = await redis.info()
+    return {
+        **{f"postgres_{key}": float(value) for key, value in postgres.items()},
+        "postgres_outbox_bytes": float(outbox_size or 0),
+        "redis_used_cpu_sys": float(info["used_cpu_sys"]),
+        "redis_used_cpu_user": float(info["used_cpu_user"]),
+        "redis_used_memory": float(info["used_memory"]),
+        "redis_commands_processed": float(info["total_commands_processed"]),
+    }
+
+
+async def cleanup(engine: AsyncEngine, redis: Redis, streams: list[str]) -> None:
+    async with AsyncSession(engine) as session:
+        await session.execute(
+            delete(OutboxMessage).where(
+                col(OutboxMessage.entity).startswith(ENTITY_PREFIX)
+            )
+        )
+        await session.execute(
+            delete(HandledMessage).where(
+                col(HandledMessage.handler_name) == benchmark_index_topic.__name__
+            )
+        )
+        await session.commit()
+    await redis.delete(*streams)
+
+
+async def run(config: PipelineConfig, args: argparse.Namespace) -> dict[str, Any]:
+    global _handled
+    engine = get_engine()
+    redis = get_redis(RedisRole.CACHE)
+    streams = stream_shards(STREAM, config.shards)
+    await cleanup(engine, redis, streams)
+    _handled = 0
+
+    dispatchers = []
+    for _ in range(config.dispatchers):
+        dispatcher = MessageDispatcher(stream=STREAM)
+        dispatcher.register()(benchmark_index_topic)
+        dispatcher.set_engine(engine)
+        dispatcher.set_redis(get_redis(RedisRole.CONSUMER))
+        dispatcher.set_command_redis(get_redis(RedisRole.COMMAND))
+        dispatcher.set_streams(streams)
+        dispatcher.start()
+        dispatchers.append(dispatcher)
+    # Consumer groups start at "$", so they must exist before publishing.
+    await asyncio.sleep(0.5)
+
+    publisher = OutboxPublisher(
+        engine=engine,
+        redis=get_redis(RedisRole.PUBLISHER),
+        stream=STREAM,
+        batch_size=config.batch_size,
+        shard_count=config.shards,
+    )
+    publisher.start(config.publishers)
+
+    before = await resource_snapshot(engine, redis)
+    samples: list[dict[str, Any]] = []
+    started = time.monotonic()
+    producer = asyncio.create_task(
+        produce(engine, args.rate, args.duration, args.burst)
+    )
+    drained_at: float | None = None
+    while time.monotonic() - started < args.duration + args.drain_timeout:
+        await asyncio.sleep(1)
+        backlog = await outbox_backlog(engine)
+        sample = {
+            "t": round(time.monotonic() - started, 1),
+            "handled": _handled,
+            "outbox_backlog": backlog,
+            **await stream_group(redis, streams),
+        }
+        samples.append(sample)
+        print(
+            f"  t={sample['t']:>6}s handled={_handled:>7} outbox={backlog:>7} "
+            f"lag={sample['lag']} pending={sample['pending']}"
+        )
+        if producer.done() and _handled >= producer.result():
+            drained_at = time.monotonic() - started
+            break
+    inserted = await producer
+    elapsed = drained_at or time.monotonic() - started
+    after = await resource_snapshot(engine, redis)
+
+    await publisher.stop()
+    for dispatcher in dispatchers:
+        await dispatcher.stop()
+    await cleanup(engine, redis, streams)
+
+    return {
+        "config": config.model_dump(),
+        "inserted": inserted,
+        "handled": _handled,
+        "drained": drained_at is not None,
+        "elapsed_s": elapsed,
+        "throughput": _handled / elapsed if elapsed else 0.0,
+        "max_outbox_backlog": max((s["outbox_backlog"] for s in samples), default=0),
+        "max_stream_lag": max((s["lag"] or 0 for s in samples), default=0),
+        "resources": {key: after[key] - before[key] for key in before},
+        "samples": samples,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    fake_openai = FakeOpenAI(args.latency_ms, args.jitter_ms, args.rate_limit_ratio)
+    os.environ["OPENAI_BASE_URL"] = await fake_openai.start(port=args.openai_port)
+    initialize_engine()
+    initialize_redis()
+    initialize_openai()
+    results = []
+    try:
+        for config in args.configs:
+            print(f"Running {config.model_dump()}")
+            summary = await run(config, args)
+            print(
+                f"  throughput={summary['throughput']:.0f} events/s "
+                f"drained={summary['drained']} "
+                f"max_outbox_backlog={summary['max_outbox_backlog']}"
+            )
+            results.append(summary)
+    finally:
+        await dispose_openai()
+        await dispose_redis()
+        await dispose_engine()
+        await fake_openai.stop()
+    write_results(
+        args.output,
+        {
+            "rate": args.rate,
+            "duration": args.duration,
+            "burst": args.burst,
+            "openai": {
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "rate_limit_ratio": args.rate_limit_ratio,
+                "requests": fake_openai.requests,
+                "rate_limited": fake_openai.rate_limited,
+            },
+            "results": results,
+        },
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=(
+            "Measure outbox -> stream -> handler throughput. Run against a "
+            "dedicated database and Redis: the publisher claims every outbox row."
+        )
+    )
+    parser.add_argument("--rate", type=float, default=200, help="Events per second.")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--burst", type=int, default=0, help="Events inserted at once.")
+    parser.add_argument("--drain-timeout", type=float, default=60)
+    parser.add_argument(
+        "--configs",
+        type=PipelineConfig.parse,
+        nargs="+",
+        default=[PipelineConfig()],
+        help="e.g. publishers=2,batch_size=100,dispatchers=4,shards=4",
+    )
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--openai-port", type=int, default=8766)
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import random
+import time
+from pathlib import Path
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, delete, not_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from benchmarks.common import summarize, write_results
+from digestify_topics.db import create_engine, warm_up_engine
+from digestify_topics.models import Topic, User
+from digestify_topics.settings import get_settings
+
+
+async def seed(engine: AsyncEngine, topic_count: int) -> tuple[UUID, list[UUID]]:
+    async with AsyncSession(engine) as session:
+        user = User(created_topic_count=topic_count)
+        user.increment_version()
+        session.add(user)
+        topics = []
+        for i in range(topic_count):
+            topic = Topic(
+                name=f"Benchmark topic {i}",
+                description="Seeded by benchmarks.pool",
+                user_id=user.id,
+                is_public=i % 2 == 0,
+                locale="en",
+            )
+            topic.increment_version()
+            topics.append(topic)
+        session.add_all(topics)
+        await session.commit()
+        return user.id, [topic.id for topic in topics]
+
+
+async def cleanup(engine: AsyncEngine, user_id: UUID) -> None:
+    async with AsyncSession(engine) as session:
+        await session.execute(delete(Topic).where(col(Topic.user_id) == user_id))
+        await session.execute(delete(User).where(col(User.id) == user_id))
+        await session.commit()
+
+
+async def hot_query(engine: AsyncEngine, user_id: UUID, topic_ids: list[UUID]) -> None:
+    # Mirrors the router's read paths: one session per request, one query each.
+    async with AsyncSession(engine) as session:
+        match random.randrange(3):
+            case 0:
+                topic_id = random.choice(topic_ids)
+                (await session.exec(select(Topic).where(Topic.id == topic_id))).one()
+            case 1:
+                statement = select(Topic).where(
+                    Topic.user_id == user_id, not_(Topic.discarded)
+                )
+                (await session.exec(statement)).all()
+            case _:
+                (await session.exec(select(User).where(User.id == user_id))).one()
+
+
+async def prepared_statement_count(engine: AsyncEngine) -> int:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT count(*) FROM pg_prepared_statements")
+        )
+        return int(result.scalar_one())
+
+
+async def run(
+    pool_size: int,
+    concurrency: int,
+    requests: int,
+    topic_count: int,
+    warmup: bool,
+) -> dict[str, float]:
+    settings = get_settings().model_copy(
+        update={"postgres_pool_size": pool_size, "postgres_max_overflow": 0}
+    )
+    engine = create_engine(settings)
+    try:
+        if warmup:
+            await warm_up_engine(engine, pool_size)
+        user_id, topic_ids = await seed(engine, topic_count)
+        latencies: list[float] = []
+        remaining = requests
+
+        async def worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                await hot_query(engine, user_id, topic_ids)
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        summary = summarize(latencies, elapsed)
+        summary["pool_size"] = pool_size
+        summary["concurrency"] = concurrency
+        # With the statement cache working this stays at the number of
+        # distinct hot queries rather than growing with the request count.
+        summary["prepared_statements"] = await prepared_statement_count(engine)
+        await cleanup(engine, user_id)
+        return summary
+    finally:
+        await engine.dispose()
+
+
+async def main(args: argparse.Namespace) -> None:
+    results = []
+    for pool_size in args.pool_sizes:
+        for concurrency in args.concurrency:
+            summary = await run(
+                pool_size=pool_size,
+                concurrency=concurrency,
+                requests=args.requests,
+                topic_count=args.topics,
+                warmup=not args.no_warmup,
+            )
+            print(
+                f"pool={pool_size:>3} concurrency={concurrency:>4} "
+                f"p50={summary['p50_ms']:.2f}ms p99={summary['p99_ms']:.2f}ms "
+                f"rps={summary['throughput']:.0f}"
+            )
+            results.append(summary)
+    write_results(args.output, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure read latency under concurrency for several pool sizes."
+    )
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--topics", type=int, default=100)
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--output", type=Path, default=None)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,3 @@
+from digestify_topics.cli import main
+
+__all__ = ["main"]
@@ -1,24 +1,34 @@
-from openai import AsyncOpenAI
+import time
+from typing import TYPE_CHECKING
 
+from .metrics import OPENAI_LATENCY, OPENAI_TOKENS
 from .settings import get_settings
 
-_openai: AsyncOpenAI | None = None
+# The OpenAI client is slow to import and only needed by message handlers.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types.chat import ChatCompletionMessageParam
+
+_openai: "AsyncOpenAI | None" = None
 
 
 LANGUAGE_MODEL = "gpt-4.1"
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSIONS = 768
+MODERATION_MODEL = "omni-moderation-latest"
 
 
 def initialize_openai() -> None:
     global _openai
     if _openai is not None:
         raise ValueError("OpenAI has already been initialized.")
+    from openai import AsyncOpenAI
+
     settings = get_settings()
     _openai = AsyncOpenAI(api_key=settings.openai_api_key)
 
 
-def get_openai() -> AsyncOpenAI:
+def get_openai() -> "AsyncOpenAI":
     global _openai
     if _openai is None:
         raise ValueError("OpenAI has not been initialized.")
@@ -30,3 +40,65 @@ async def dispose_openai() -> None:
     openai = get_openai()
     await openai.close()
     _openai = None
+
+
+async def create_embeddings(texts: list[str]) -> list[list[float]]:
+    openai = get_openai()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await openai.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=texts,
+            dimensions=EMBEDDING_DIMENSIONS,
+        )
+        outcome = "success"
+    finally:
+        OPENAI_LATENCY.labels(
+            operation="embeddings", model=EMBEDDING_MODEL, outcome=outcome
+        ).observe(time.perf_counter() - started)
+    OPENAI_TOKENS.labels(
+        operation="embeddings", model=EMBEDDING_MODEL, kind="prompt"
+    ).inc(response.usage.prompt_tokens)
+    return [embedding.embedding for embedding in response.data]
+
+
+async def create_chat_completion(
+    messages: list["ChatCompletionMessageParam"],
+) -> str:
+    openai = get_openai()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await openai.chat.completions.create(
+            model=LANGUAGE_MODEL,
+            messages=messages,
+        )
+        outcome = "success"
+    finally:
+        OPENAI_LATENCY.labels(
+            operation="chat", model=LANGUAGE_MODEL, outcome=outcome
+        ).observe(time.perf_counter() - started)
+    if response.usage is not None:
+        OPENAI_TOKENS.labels(operation="chat", model=LANGUAGE_MODEL, kind="prompt").inc(
+            response.usage.prompt_tokens
+        )
+        OPENAI_TOKENS.labels(
+            operation="chat", model=LANGUAGE_MODEL, kind="completion"
+        ).inc(response.usage.completion_tokens)
+    return response.choices[0].message.content or ""
+
+
+async def create_moderation(text: str) -> bool:
+    # True when the text is flagged in any category.
+    openai = get_openai()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        response = await openai.moderations.create(model=MODERATION_MODEL, input=text)
+        outcome = "success"
+    finally:
+        OPENAI_LATENCY.labels(
+            operation="moderation", model=MODERATION_MODEL, outcome=outcome
+        ).observe(time.perf_counter() - started)
+    return any(result.flagged for result in response.results)
@@ -1,48 +1,135 @@
-from collections.abc import AsyncIterator
+import os
+import re
+import time
+import uuid
+from collections.abc import AsyncIterator, Awaitable, Callable
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from prometheus_client import CollectorRegistry, make_asgi_app, multiprocess
+from starlette.types import ASGIApp
 
 from digestify_topics.ai import dispose_openai, initialize_openai
 from digestify_topics.auth import get_auth, mock_get_auth
-from digestify_topics.db import dispose_engine, get_engine, initialize_engine
+from digestify_topics.db import (
+    dispose_engine,
+    get_engine,
+    get_read_engine,
+    initialize_engine,
+    warm_up_engine,
+)
 from digestify_topics.handlers import dispatcher
+from digestify_topics.metrics import REQUEST_LATENCY
 from digestify_topics.outbox_publisher import OutboxPublisher
 from digestify_topics.queries import HTTPQueries, MockQueries
 from digestify_topics.router import router
 from digestify_topics.settings import get_settings
 from digestify_topics.stream import (
+    BACKFILL_STREAM,
+    STREAM,
+    RedisRole,
+    consumer_streams,
     dispose_redis,
     get_redis,
     initialize_redis,
 )
+from digestify_topics.tracing import set_request_id
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    settings = get_settings()
     initialize_engine()
     initialize_redis()
-    initialize_openai()
-    stream = "digestify_topics"
+    # Handlers and remote moderation both call OpenAI.
+    use_openai = settings.api_background_enabled or settings.moderation_remote_enabled
+    if use_openai:
+        initialize_openai()
+    if settings.postgres_pool_warmup:
+        await warm_up_engine(get_engine(), settings.postgres_pool_size)
+        if get_read_engine() is not get_engine():
+            await warm_up_engine(get_read_engine(), settings.postgres_pool_size)
     message_publisher = OutboxPublisher(
         engine=get_engine(),
-        redis=get_redis(),
-        stream=stream,
+        redis=get_redis(RedisRole.PUBLISHER),
+        stream=STREAM,
+        batch_size=settings.outbox_batch_size,
+        partition_size=settings.outbox_partition_size,
+        shard_count=settings.stream_shard_count,
     )
-    message_publisher.start()
-    dispatcher.set_redis(get_redis())
-    dispatcher.set_engine(get_engine())
-    dispatcher.start()
+    # Background components can run in dedicated processes instead (see
+    # `digestify-topics publisher` and `digestify-topics worker`).
+    if settings.api_background_enabled:
+        message_publisher.start()
+        dispatcher.set_redis(get_redis(RedisRole.CONSUMER))
+        dispatcher.set_command_redis(get_redis(RedisRole.COMMAND))
+        dispatcher.set_engine(get_engine())
+        dispatcher.set_streams(consumer_streams(settings))
+        dispatcher.set_handled_retention(settings.handled_message_retention_seconds)
+        dispatcher.set_backfill_streams(
+            [BACKFILL_STREAM], settings.backfill_concurrency
+        )
+        dispatcher.start()
     try:
         yield
     finally:
-        await message_publisher.stop()
-        await dispatcher.stop()
-        await dispose_openai()
+        await message_publisher.stop(settings.shutdown_timeout)
+        await dispatcher.stop(settings.shutdown_timeout)
+        if use_openai:
+            await dispose_openai()
         await dispose_redis()
         await dispose_engine()
 
 
+async def observe_request_latency(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template rather than raw path to keep cardinality
+        # bounded; unmatched paths share one label.
+        route = request.scope.get("route")
+        REQUEST_LATENCY.labels(
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        ).observe(time.perf_counter() - started)
+
+
+_REQUEST_ID = re.compile(r"[A-Za-z0-9._:-]{1,64}")
+
+
+async def assign_request_id(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    # Carried into outbox messages so events can be traced to their request.
+    # A client's ID is only kept when it is short and plain enough to store
+    # and log as is; any other gets a fresh one.
+    request_id = request.headers.get("X-Request-ID", "")
+    if not _REQUEST_ID.fullmatch(request_id):
+        request_id = uuid.uuid4().hex
+    set_request_id(request_id)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+def metrics_app() -> ASGIApp:
+    # Each API process writes its metrics to files in PROMETHEUS_MULTIPROC_DIR,
+    # which `digestify-topics api --processes N` sets, so that a scrape served
+    # by any one process reports all of them.
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return make_asgi_app()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return make_asgi_app(registry)
+
+
 def create_app() -> FastAPI:
     settings = get_settings()
 
@@ -52,6 +139,21 @@ def create_app() -> FastAPI:
         debug=settings.debug,
     )
     app.include_router(router)
+    if settings.profiling_enabled:
+        # Imported here so that the profiler is only loaded when enabled.
+        from digestify_topics.profiling import (
+            ProfilingMiddleware,
+            install_sql_hooks,
+            profiling_router,
+        )
+
+        install_sql_hooks()
+        # Added first, so that it is the innermost middleware.
+        app.add_middleware(ProfilingMiddleware)
+        app.include_router(profiling_router)
+    app.middleware("http")(assign_request_id)
+    app.middleware("http")(observe_request_latency)
+    app.mount("/metrics", metrics_app())
 
     if settings.debug:
         app.dependency_overrides[get_auth] = mock_get_auth
@@ -60,4 +162,15 @@ def create_app() -> FastAPI:
     return app
 
 
-app = create_app()
+_app: FastAPI | None = None
+
+
+def __getattr__(name: str) -> FastAPI:
+    # `app` is built on first access so that importing this module does not
+    # load settings; `uvicorn digestify_topics.app:app` still works.
+    global _app
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if _app is None:
+        _app = create_app()
+    return _app
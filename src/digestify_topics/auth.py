@@ -1,10 +1,8 @@
 import base64
-from typing import Annotated
+from typing import TYPE_CHECKING, Annotated
 from uuid import UUID
 
-import httpx
 import jwt
-from cryptography.hazmat.primitives.asymmetric import ec
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jwt import InvalidTokenError
@@ -12,13 +10,16 @@ from pydantic import BaseModel
 
 from digestify_topics.settings import get_settings
 
+if TYPE_CHECKING:
+    from cryptography.hazmat.primitives.asymmetric import ec
+
 
 class Auth(BaseModel):
     id: UUID
     is_anonymous: bool
 
 
-_public_keys = {}  # kid → public key object
+_public_keys: dict[str, "ec.EllipticCurvePublicKey"] = {}  # kid → public key object
 _security = HTTPBearer()
 
 
@@ -30,6 +31,8 @@ def b64url_decode(val: str) -> bytes:
 
 
 def jwk_to_public_key(jwk):
+    from cryptography.hazmat.primitives.asymmetric import ec
+
     x_bytes = b64url_decode(jwk["x"])
     y_bytes = b64url_decode(jwk["y"])
     public_numbers = ec.EllipticCurvePublicNumbers(
@@ -40,9 +43,16 @@ def jwk_to_public_key(jwk):
     return public_numbers.public_key()
 
 
+def add_public_key(kid: str, public_key: "ec.EllipticCurvePublicKey") -> None:
+    _public_keys[kid] = public_key
+
+
 async def fetch_jwks():
     """Fetch JWKS from Supabase on startup."""
+    import httpx
+
     global _public_keys
+
     settings = get_settings()
     async with httpx.AsyncClient() as client:
         resp = await client.get(settings.jwks_url)
@@ -85,5 +95,11 @@ def get_auth(
     return auth
 
 
+def get_admin_auth(auth: Annotated[Auth, Depends(get_auth)]) -> Auth:
+    if auth.id not in get_settings().admin_user_ids:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return auth
+
+
 def mock_get_auth() -> Auth:
     return Auth(id=UUID("12345678-1234-5678-1234-567812345678"), is_anonymous=False)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from uuid import UUID
+
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, not_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics.messages import Message, TopicCreated
+from digestify_topics.metrics import BACKFILL_BACKLOG, BACKFILL_EMITTED
+from digestify_topics.models import Topic
+from digestify_topics.tracing import TraceContext
+
+logger = logging.getLogger(__name__)
+
+
+def _stream_id(value: bytes) -> tuple[int, int]:
+    milliseconds, sequence = value.decode().split("-")
+    return int(milliseconds), int(sequence)
+
+
+async def trim_consumed(redis: Redis, stream: str) -> int:
+    # Drops the entries that every consumer group has acknowledged and
+    # returns the number left, which is the backlog of the slowest group.
+    try:
+        groups = await redis.xinfo_groups(stream)
+    except ResponseError:
+        # The stream does not exist yet.
+        return 0
+    keep = []
+    for group in groups:
+        if group["pending"]:
+            keep.append((await redis.xpending(stream, group["name"]))["min"])
+        else:
+            keep.append(group["last-delivered-id"])
+    if keep:
+        oldest = min(keep, key=_stream_id)
+        await redis.xtrim(stream, minid=oldest.decode(), approximate=False)
+    return await redis.xlen(stream)
+
+
+class Backfill:
+    # Walks live topics in primary key order and re-emits a TopicCreated
+    # replay for each to a dedicated stream. Progress is checkpointed in
+    # Redis after every batch, so an interrupted run resumes where it
+    # stopped; a batch may then be emitted twice.
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        redis: Redis,
+        stream: str,
+        name: str = "default",
+        rate: float = 100,
+        batch_size: int = 500,
+        max_backlog: int = 10_000,
+        handlers: list[str] | None = None,
+    ) -> None:
+        self._engine = engine
+        self._redis = redis
+        self._stream = stream
+        self._name = name
+        self._rate = rate
+        self._batch_size = batch_size
+        self._max_backlog = max_backlog
+        self._handlers = handlers
+        self._checkpoint_key = f"backfill:{name}:checkpoint"
+        self._stopping = asyncio.Event()
+
+    async def _sleep(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except TimeoutError:
+            pass
+
+    async def _next_batch(self, after: UUID | None) -> list[tuple[UUID, UUID, int]]:
+        statement = (
+            select(col(Topic.id), col(Topic.user_id), col(Topic.version))
+            .where(not_(Topic.discarded))
+            .order_by(col(Topic.id))
+            .limit(self._batch_size)
+        )
+        if after is not None:
+            statement = statement.where(col(Topic.id) > after)
+        async with AsyncSession(self._engine) as session:
+            return list((await session.exec(statement)).all())
+
+    def _message(self, topic_id: UUID, user_id: UUID, version: int) -> str:
+        message = Message(
+            id=str(uuid.uuid4()),
+            type=TopicCreated.__name__,
+            payload=TopicCreated(topic_id=topic_id, user_id=user_id).model_dump(
+                mode="json"
+            ),
+            entity=f"topic:{topic_id}",
+            version=version,
+            replay=True,
+            handlers=self._handlers,
+            trace=TraceContext(published_at=datetime.now(timezone.utc)),
+        )
+        return message.model_dump_json()
+
+    async def run(self, restart: bool = False) -> None:
+        self._stopping.clear()
+        if restart:
+            await self._redis.delete(self._checkpoint_key)
+        checkpoint = await self._redis.get(self._checkpoint_key)
+        after = None if checkpoint is None else UUID(checkpoint.decode())
+        emitted = 0
+        next_batch_at = time.monotonic()
+        while not self._stopping.is_set():
+            # Hold off while the consumers are behind, so that the backfill
+            # stream stays short and the workers' database connections are
+            # not all taken by replays.
+            backlog = await trim_consumed(self._redis, self._stream)
+            BACKFILL_BACKLOG.labels(name=self._name).set(backlog)
+            if backlog >= self._max_backlog:
+                await self._sleep(1)
+                continue
+
+            topics = await self._next_batch(after)
+            if not topics:
+                logger.info(f"Backfill {self._name} finished after {emitted} topics")
+                return
+            after = topics[-1][0]
+            # The checkpoint is written in the same round trip, after the
+            # batch's messages.
+            async with self._redis.pipeline(transaction=False) as pipeline:
+                for topic_id, user_id, version in topics:
+                    pipeline.xadd(
+                        self._stream,
+                        {"data": self._message(topic_id, user_id, version)},
+                    )
+                pipeline.set(self._checkpoint_key, str(after))
+                await pipeline.execute()
+            emitted += len(topics)
+            BACKFILL_EMITTED.labels(name=self._name).inc(len(topics))
+            logger.info(f"Backfill {self._name} emitted {emitted} topics up to {after}")
+
+            next_batch_at = (
+                max(next_batch_at, time.monotonic()) + len(topics) / self._rate
+            )
+            await self._sleep(next_batch_at - time.monotonic())
+
+    def stop(self) -> None:
+        self._stopping.set()
@@ -0,0 +1,335 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import tempfile
+from collections.abc import Awaitable, Callable
+from types import FrameType
+from typing import Any
+
+# Component modules are imported inside the runners so that each subcommand
+# only loads what it actually starts.
+
+
+async def _wait_for_shutdown() -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+    await stopping.wait()
+
+
+async def _run_until_shutdown(running: Awaitable[None]) -> None:
+    # Returns on SIGINT or SIGTERM. Raises as soon as `running` fails, so
+    # that the process exits non-zero and is restarted instead of idling.
+    task = asyncio.ensure_future(running)
+    shutdown = asyncio.create_task(_wait_for_shutdown())
+    await asyncio.wait([task, shutdown], return_when=asyncio.FIRST_COMPLETED)
+    shutdown.cancel()
+    if not task.done():
+        task.cancel()
+        return
+    task.result()
+
+
+async def run_publisher(task_count: int) -> None:
+    from digestify_topics.db import dispose_engine, get_engine, initialize_engine
+    from digestify_topics.outbox_publisher import OutboxPublisher
+    from digestify_topics.settings import get_settings
+    from digestify_topics.stream import (
+        STREAM,
+        RedisRole,
+        dispose_redis,
+        get_redis,
+        initialize_redis,
+    )
+
+    settings = get_settings()
+    initialize_engine()
+    initialize_redis()
+    publisher = OutboxPublisher(
+        engine=get_engine(),
+        redis=get_redis(RedisRole.PUBLISHER),
+        stream=STREAM,
+        batch_size=settings.outbox_batch_size,
+        partition_size=settings.outbox_partition_size,
+        shard_count=settings.stream_shard_count,
+    )
+    publisher.start(task_count)
+    try:
+        await _run_until_shutdown(publisher.wait())
+    finally:
+        await publisher.stop(settings.shutdown_timeout)
+        await dispose_redis()
+        await dispose_engine()
+
+
+async def run_worker(process_index: int = 0, process_count: int = 1) -> None:
+    from digestify_topics.ai import dispose_openai, initialize_openai
+    from digestify_topics.db import dispose_engine, get_engine, initialize_engine
+    from digestify_topics.handlers import dispatcher
+    from digestify_topics.settings import get_settings
+    from digestify_topics.stream import (
+        BACKFILL_STREAM,
+        RedisRole,
+        consumer_streams,
+        dispose_redis,
+        get_redis,
+        initialize_redis,
+    )
+
+    settings = get_settings()
+    initialize_engine()
+    initialize_redis()
+    initialize_openai()
+    dispatcher.set_redis(get_redis(RedisRole.CONSUMER))
+    dispatcher.set_command_redis(get_redis(RedisRole.COMMAND))
+    dispatcher.set_engine(get_engine())
+    dispatcher.set_streams(consumer_streams(settings, process_index, process_count))
+    dispatcher.set_handled_retention(settings.handled_message_retention_seconds)
+    dispatcher.set_backfill_streams([BACKFILL_STREAM], settings.backfill_concurrency)
+    dispatcher.start()
+    try:
+        await _run_until_shutdown(dispatcher.wait())
+    finally:
+        await dispatcher.stop(settings.shutdown_timeout)
+        await dispose_openai()
+        await dispose_redis()
+        await dispose_engine()
+
+
+async def run_backfill(
+    name: str,
+    rate: float,
+    batch_size: int,
+    max_backlog: int,
+    handlers: list[str] | None,
+    restart: bool,
+) -> None:
+    from digestify_topics.backfill import Backfill
+    from digestify_topics.db import dispose_engine, get_engine, initialize_engine
+    from digestify_topics.stream import (
+        BACKFILL_STREAM,
+        RedisRole,
+        dispose_redis,
+        get_redis,
+        initialize_redis,
+    )
+
+    initialize_engine()
+    initialize_redis()
+    backfill = Backfill(
+        engine=get_engine(),
+        redis=get_redis(RedisRole.PUBLISHER),
+        stream=BACKFILL_STREAM,
+        name=name,
+        rate=rate,
+        batch_size=batch_size,
+        max_backlog=max_backlog,
+        handlers=handlers,
+    )
+    running = asyncio.create_task(backfill.run(restart))
+    shutdown = asyncio.create_task(_wait_for_shutdown())
+    try:
+        await asyncio.wait([running, shutdown], return_when=asyncio.FIRST_COMPLETED)
+        # Stopping between batches leaves the checkpoint at the last one sent.
+        backfill.stop()
+        await running
+    finally:
+        shutdown.cancel()
+        await dispose_redis()
+        await dispose_engine()
+
+
+def _serve_metrics(port: int | None) -> None:
+    if port is None:
+        return
+    from prometheus_client import start_http_server
+
+    start_http_server(port)
+
+
+def _publisher_process(
+    process_index: int, metrics_port: int | None, task_count: int
+) -> None:
+    _serve_metrics(metrics_port)
+    asyncio.run(run_publisher(task_count))
+
+
+def _worker_process(
+    process_index: int, metrics_port: int | None, process_count: int
+) -> None:
+    _serve_metrics(metrics_port)
+    # Processes split the stream shards between them.
+    asyncio.run(run_worker(process_index, process_count))
+
+
+def _run_processes(
+    target: Callable[..., None],
+    process_count: int,
+    metrics_port: int | None,
+    *args: Any,
+) -> None:
+    if process_count == 1:
+        target(0, metrics_port, *args)
+        return
+
+    # Each process serves its own metrics on consecutive ports.
+    processes = [
+        multiprocessing.Process(
+            target=target,
+            args=(
+                index,
+                None if metrics_port is None else metrics_port + index,
+                *args,
+            ),
+        )
+        for index in range(process_count)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward(signum: int, frame: FrameType | None) -> None:
+        for process in processes:
+            if process.pid is not None and process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+
+    # A process that fails takes the others down with it, so that the
+    # supervisor restarts them all rather than running short of one.
+    failed = False
+    running = list(processes)
+    while running:
+        multiprocessing.connection.wait([process.sentinel for process in running])
+        for process in [process for process in running if not process.is_alive()]:
+            running.remove(process)
+            if process.exitcode != 0 and not failed:
+                failed = True
+                forward(signal.SIGTERM, None)
+    if failed:
+        sys.exit(1)
+
+
+def _run_api(args: argparse.Namespace) -> None:
+    import uvicorn
+
+    if args.no_background:
+        os.environ["API_BACKGROUND_ENABLED"] = "false"
+    if args.processes > 1 and "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        # Otherwise each scrape would only see the process that served it.
+        # Must be set before the processes import prometheus_client.
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(
+            prefix="digestify-topics-metrics-"
+        )
+    uvicorn.run(
+        "digestify_topics.app:app",
+        host=args.host,
+        port=args.port,
+        workers=args.processes,
+    )
+
+
+def _run_publisher(args: argparse.Namespace) -> None:
+    _run_processes(_publisher_process, args.processes, args.metrics_port, args.tasks)
+
+
+def _run_worker(args: argparse.Namespace) -> None:
+    from digestify_topics.settings import get_settings
+    from digestify_topics.stream import consumer_streams
+
+    # Fail before starting any process if they cannot all be given shards.
+    try:
+        consumer_streams(get_settings(), 0, args.processes)
+    except ValueError as e:
+        sys.exit(str(e))
+    _run_processes(_worker_process, args.processes, args.metrics_port, args.processes)
+
+
+def _run_backfill(args: argparse.Namespace) -> None:
+    logging.basicConfig(level=logging.INFO)
+    _serve_metrics(args.metrics_port)
+    asyncio.run(
+        run_backfill(
+            args.name,
+            args.rate,
+            args.batch_size,
+            args.max_backlog,
+            args.handler,
+            args.restart,
+        )
+    )
+
+
+def _parse_args(argv: list[str] | None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="digestify-topics")
+    subparsers = parser.add_subparsers(required=True)
+
+    api = subparsers.add_parser("api", help="Serve the HTTP API.")
+    api.add_argument("--host", default="127.0.0.1")
+    api.add_argument("--port", type=int, default=8000)
+    api.add_argument("--processes", type=int, default=1)
+    api.add_argument(
+        "--no-background",
+        action="store_true",
+        help="Do not run the outbox publisher and dispatcher in the API process.",
+    )
+    api.set_defaults(run=_run_api)
+
+    publisher = subparsers.add_parser(
+        "publisher", help="Publish outbox messages to the stream."
+    )
+    publisher.add_argument("--processes", type=int, default=1)
+    publisher.add_argument(
+        "--tasks", type=int, default=1, help="Publisher tasks per process."
+    )
+    publisher.add_argument("--metrics-port", type=int, default=None)
+    publisher.set_defaults(run=_run_publisher)
+
+    worker = subparsers.add_parser("worker", help="Run the message handlers.")
+    worker.add_argument("--processes", type=int, default=1)
+    worker.add_argument("--metrics-port", type=int, default=None)
+    worker.set_defaults(run=_run_worker)
+
+    backfill = subparsers.add_parser(
+        "backfill",
+        help="Re-emit TopicCreated for every live topic to the backfill stream.",
+    )
+    backfill.add_argument(
+        "--name",
+        default="default",
+        help="Checkpoint name; a run with the same name resumes where it stopped.",
+    )
+    backfill.add_argument(
+        "--rate", type=float, default=100, help="Topics emitted per second."
+    )
+    backfill.add_argument("--batch-size", type=int, default=500)
+    backfill.add_argument(
+        "--max-backlog",
+        type=int,
+        default=10_000,
+        help="Pause while the slowest consumer group is this far behind.",
+    )
+    backfill.add_argument(
+        "--handler",
+        action="append",
+        default=None,
+        help="Only run this handler on the replays. Can be repeated.",
+    )
+    backfill.add_argument(
+        "--restart", action="store_true", help="Ignore the saved checkpoint."
+    )
+    backfill.add_argument("--metrics-port", type=int, default=None)
+    backfill.set_defaults(run=_run_backfill)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    args.run(args)
@@ -1,11 +1,16 @@
+import asyncio
+import time
 from typing import AsyncIterator
 
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio.engine import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from digestify_topics.settings import get_settings
+from digestify_topics.settings import Settings, get_settings
 
 _engine: AsyncEngine | None = None
+_read_engine: AsyncEngine | None = None
 
 
 def create_database_url(
@@ -20,20 +25,70 @@ def create_database_url(
     return url
 
 
-def initialize_engine() -> None:
-    global _engine
-    if _engine is not None:
-        raise ValueError("Engine has already been initialized.")
-    settings = get_settings()
+def _timed_pool_class(name: str) -> type[AsyncAdaptedQueuePool]:
+    # A subclass per engine, since the pool is rebuilt from its class on
+    # dispose and cannot carry extra constructor arguments. Metrics are
+    # imported here so that importing this module, as migrations and the
+    # workers do, stays light.
+    from digestify_topics.metrics import DB_POOL_CHECKOUT_WAIT
+
+    wait = DB_POOL_CHECKOUT_WAIT.labels(engine=name)
+
+    class TimedQueuePool(AsyncAdaptedQueuePool):
+        def _do_get(self) -> ConnectionPoolEntry:
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                wait.observe(time.perf_counter() - started)
+
+    return TimedQueuePool
+
+
+def create_engine(
+    settings: Settings,
+    host: str | None = None,
+    port: int | None = None,
+    name: str = "primary",
+) -> AsyncEngine:
     url = create_database_url(
         driver="postgresql+asyncpg",
         user=settings.postgres_user,
         password=settings.postgres_password,
-        host=settings.postgres_host,
-        port=settings.postgres_port,
+        host=host or settings.postgres_host,
+        port=port or settings.postgres_port,
         db=settings.postgres_db,
     )
-    _engine = create_async_engine(url)
+    return create_async_engine(
+        url,
+        poolclass=_timed_pool_class(name),
+        pool_size=settings.postgres_pool_size,
+        max_overflow=settings.postgres_max_overflow,
+        pool_timeout=settings.postgres_pool_timeout,
+        pool_recycle=settings.postgres_pool_recycle,
+        pool_pre_ping=settings.postgres_pool_pre_ping,
+        connect_args={
+            # Cache of prepared statements kept per connection by the
+            # SQLAlchemy asyncpg adapter, keyed by the compiled SQL string.
+            "prepared_statement_cache_size": settings.postgres_statement_cache_size,
+            "server_settings": {"jit": "on" if settings.postgres_jit else "off"},
+        },
+    )
+
+
+def initialize_engine() -> None:
+    global _engine, _read_engine
+    if _engine is not None:
+        raise ValueError("Engine has already been initialized.")
+    settings = get_settings()
+    _engine = create_engine(settings)
+    if settings.postgres_read_host is not None:
+        _read_engine = create_engine(
+            settings,
+            host=settings.postgres_read_host,
+            port=settings.postgres_read_port,
+            name="replica",
+        )
 
 
 def get_engine() -> AsyncEngine:
@@ -43,11 +98,35 @@ def get_engine() -> AsyncEngine:
     return _engine
 
 
+def get_read_engine() -> AsyncEngine:
+    global _read_engine
+    if _read_engine is None:
+        return get_engine()
+    return _read_engine
+
+
+async def warm_up_engine(engine: AsyncEngine, connection_count: int) -> None:
+    # Hold all connections at once so that the pool really opens
+    # `connection_count` distinct connections instead of reusing one.
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(connection_count))
+    )
+    try:
+        await asyncio.gather(
+            *(connection.execute(text("SELECT 1")) for connection in connections)
+        )
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+
 async def dispose_engine() -> None:
-    global _engine
+    global _engine, _read_engine
     engine = get_engine()
     await engine.dispose()
     _engine = None
+    if _read_engine is not None:
+        await _read_engine.dispose()
+        _read_engine = None
 
 
 async def get_session() -> AsyncIterator[AsyncSession]:
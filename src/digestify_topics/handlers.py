@@ -1,11 +1,16 @@
+import logging
+
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from digestify_topics.message_dispatcher import MessageDispatcher
 from digestify_topics.messages import TopicCreated
+from digestify_topics.stream import STREAM
+
+logger = logging.getLogger(__name__)
 
-dispatcher = MessageDispatcher(stream="digestify_topics")
+dispatcher = MessageDispatcher(stream=STREAM)
 
 
 @dispatcher.register()
 async def index_topic(payload: TopicCreated, session: AsyncSession):
-    print(f"This is a message: {payload}")
+    logger.info(f"Indexing topic {payload.topic_id}")
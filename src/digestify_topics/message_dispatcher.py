@@ -1,7 +1,10 @@
 import asyncio
 import inspect
 import logging
+import time
 import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import (
     Any,
     Awaitable,
@@ -9,17 +12,31 @@ from typing import (
     Coroutine,
     ParamSpec,
     TypeVar,
+    cast,
     get_type_hints,
 )
 
 from pydantic import BaseModel
 from redis.asyncio import Redis
-from redis.exceptions import ResponseError
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import CursorResult, delete, tuple_
+from sqlalchemy.exc import DBAPIError, IntegrityError
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from digestify_topics.messages import Message
+from digestify_topics.metrics import (
+    HANDLER_ERRORS,
+    HANDLER_LATENCY,
+    HANDLER_RETRIES,
+    HANDLER_STALE,
+    STREAM_GROUP_LAG,
+    STREAM_GROUP_PENDING,
+    STREAM_LENGTH,
+)
 from digestify_topics.models import HandledMessage
+from digestify_topics.tracing import record_span, span
 
 P = ParamSpec("P")
 R = TypeVar("R")
@@ -28,17 +45,66 @@ AsyncFunction = Callable[P, Awaitable[R]]
 
 logger = logging.getLogger(__name__)
 
+# Takes the lease if it is free, or extends it if the caller already holds it.
+LEASE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    return 1
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class _EntityVersions:
+    # Latest version seen per entity, bounded so that long-running consumers
+    # do not grow without limit; evicted entries fall back to the database.
+    def __init__(self, max_size: int = 10_000) -> None:
+        self._versions: OrderedDict[str, int] = OrderedDict()
+        self._max_size = max_size
+
+    def get(self, entity: str) -> int | None:
+        return self._versions.get(entity)
+
+    def observe(self, entity: str | None, version: int | None) -> None:
+        if entity is None or version is None:
+            return
+        if version > self._versions.get(entity, version - 1):
+            self._versions[entity] = version
+        self._versions.move_to_end(entity)
+        if len(self._versions) > self._max_size:
+            self._versions.popitem(last=False)
+
 
 class MessageDispatcher:
-    _handlers: dict[str, Callable[[], Coroutine[Any, Any, None]]]
+    _handlers: dict[str, Callable[[str], Coroutine[Any, Any, None]]]
     _tasks: list[asyncio.Task[None]]
 
-    def __init__(self, stream: str) -> None:
+    def __init__(
+        self, stream: str, concurrency: int = 16, lease_seconds: float = 10
+    ) -> None:
         self._handlers = {}
+        self._groups: list[str] = []
         self._tasks = []
-        self._stream = stream
+        self._streams = [stream]
+        self._concurrency = concurrency
+        self._lease_seconds = lease_seconds
+        self._backfill_streams: list[str] = []
+        self._backfill_concurrency = 1
+        self._handled_retention_seconds: float | None = None
         self._engine: AsyncEngine | None = None
         self._redis: Redis | None = None
+        self._command_redis: Redis | None = None
+        self._stopping = asyncio.Event()
 
     def _get_redis(self) -> Redis:
         if self._redis is None:
@@ -50,13 +116,42 @@ class MessageDispatcher:
             raise ValueError("Engine has not been set.")
         return self._engine
 
+    def _get_command_redis(self) -> Redis:
+        # Falls back to the reading client, which is enough when its pool
+        # has no limit.
+        return self._command_redis or self._get_redis()
+
     def set_redis(self, redis: Redis) -> None:
+        # Holds a connection per blocking read: one for every handler and
+        # stream.
         self._redis = redis
 
+    def set_command_redis(self, redis: Redis) -> None:
+        # Acks, leases and monitoring, which must not wait for a reader's
+        # connection.
+        self._command_redis = redis
+
     def set_engine(self, engine: AsyncEngine) -> None:
         self._engine = engine
 
-    def register(self) -> Callable[[AsyncFunction], AsyncFunction]:
+    def set_streams(self, streams: list[str]) -> None:
+        # Each handler reads every stream separately, so that no command
+        # spans more than one Redis Cluster hash slot.
+        self._streams = streams
+
+    def set_backfill_streams(self, streams: list[str], concurrency: int) -> None:
+        self._backfill_streams = streams
+        self._backfill_concurrency = concurrency
+
+    def set_handled_retention(self, seconds: float) -> None:
+        # How long handled messages are remembered: long enough for any
+        # redelivery, or an older version left behind by resharding, to
+        # arrive. Without it they are kept forever.
+        self._handled_retention_seconds = seconds
+
+    def register(
+        self, max_attempts: int = 3
+    ) -> Callable[[AsyncFunction], AsyncFunction]:
         def decorator(func: AsyncFunction) -> AsyncFunction:
             sig = inspect.signature(func)
             params = list(sig.parameters.values())
@@ -77,80 +172,495 @@ class MessageDispatcher:
                     f"{MessagePayloadSchema} must be a subclass of BaseModel"
                 )
 
-            async def handler() -> None:
-                redis = self._get_redis()
-                engine = self._get_engine()
+            # Shared by the handler's consumers of every stream, so that a
+            # replay sees the versions its live consumers handled or skipped
+            # in this process.
+            versions = _EntityVersions()
 
-                consumer_group = func.__name__
-                consumer_name = f"{consumer_group}:{uuid.uuid4().hex[:8]}"
+            async def handler(stream: str) -> None:
+                await self._consume(
+                    func, MessagePayloadSchema, max_attempts, stream, versions
+                )
 
-                # Ensure the consumer group exists; create it if not.
-                try:
-                    await redis.xgroup_create(
-                        name=self._stream,
-                        groupname=consumer_group,
-                        id="$",
-                        mkstream=True,
-                    )
-                except ResponseError as e:
-                    # Ignore if the consumer group already exists
-                    if "BUSYGROUP" not in str(e):
-                        raise
+            self._handlers[MessagePayloadSchema.__name__] = handler
+            self._groups.append(func.__name__)
 
+            return func
+
+        return decorator
+
+    async def _consume(
+        self,
+        func: AsyncFunction,
+        schema: type[BaseModel],
+        max_attempts: int,
+        stream: str,
+        versions: _EntityVersions,
+    ) -> None:
+        redis = self._get_redis()
+        commands = self._get_command_redis()
+
+        consumer_group = func.__name__
+        consumer_name = f"{consumer_group}:{uuid.uuid4().hex[:8]}"
+        backfill = stream in self._backfill_streams
+        concurrency = self._backfill_concurrency if backfill else self._concurrency
+
+        # Ensure the consumer group exists; create it if not. Backfills may
+        # queue messages before the group exists, so backfill groups start
+        # from the beginning of the stream.
+        try:
+            await commands.xgroup_create(
+                name=stream,
+                groupname=consumer_group,
+                id="0" if backfill else "$",
+                mkstream=True,
+            )
+        except ResponseError as e:
+            # Ignore if the consumer group already exists
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        # Messages are partitioned into lanes by entity key. Each lane runs
+        # its messages one at a time, in stream order, while different lanes
+        # run concurrently up to the dispatcher's concurrency limit.
+        lanes: dict[str, asyncio.Queue[tuple[bytes, Message]]] = {}
+        lane_tasks: set[asyncio.Task[None]] = set()
+        failures: list[BaseException] = []
+        in_flight = asyncio.Semaphore(concurrency)
+
+        # Lanes only order messages within this consumer, so only one
+        # consumer per group reads a stream at a time, holding a lease that
+        # another process takes over once it expires.
+        lease_key = f"{stream}:lease:{consumer_group}"
+        lease = asyncio.Event()
+
+        async def run_lane(
+            key: str, queue: asyncio.Queue[tuple[bytes, Message]]
+        ) -> None:
+            try:
                 while True:
-                    response = await redis.xreadgroup(
-                        groupname=consumer_group,
-                        consumername=consumer_name,
-                        streams={self._stream: ">"},
-                        block=1000,
-                        count=1,
-                    )
-                    if not response:
-                        continue
+                    try:
+                        message_id, message = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    try:
+                        await self._handle(
+                            func,
+                            schema,
+                            max_attempts,
+                            stream,
+                            message_id,
+                            message,
+                            versions,
+                        )
+                    finally:
+                        in_flight.release()
+            finally:
+                del lanes[key]
+                # Messages a cancelled lane never started stay pending.
+                for _ in range(queue.qsize()):
+                    in_flight.release()
+
+        def on_lane_done(task: asyncio.Task[None]) -> None:
+            lane_tasks.discard(task)
+            if not task.cancelled() and (error := task.exception()) is not None:
+                failures.append(error)
+
+        async def dispatch(message_id: bytes, redis_message: Message) -> None:
+            key = redis_message.entity or bytes(message_id).decode()
 
-                    message_id, message_data = response[0][1][0]
-                    redis_message_raw = bytes(message_data[b"data"]).decode()
+            await in_flight.acquire()
+            if not lease.is_set():
+                # Left pending for whoever holds the lease now.
+                in_flight.release()
+                return
+            queue = lanes.get(key)
+            if queue is None:
+                queue = lanes[key] = asyncio.Queue()
+                task = asyncio.create_task(run_lane(key, queue))
+                lane_tasks.add(task)
+                task.add_done_callback(on_lane_done)
+            queue.put_nowait((message_id, redis_message))
 
-                    redis_message = Message.model_validate_json(redis_message_raw)
-                    if redis_message.type != MessagePayloadSchema.__name__:
-                        # Not our message type; ack and continue so this group doesn't get stuck.
-                        await redis.xack(self._stream, consumer_group, message_id)
-                        continue
+        async def dispatch_batch(
+            entries: list[tuple[bytes, dict[bytes, Any] | None]],
+        ) -> None:
+            batch = [
+                (message_id, Message.model_validate_json(bytes(data[b"data"])))
+                for message_id, data in entries
+                if data
+            ]
+            await self._load_versions(
+                consumer_group, [message for _, message in batch], versions, backfill
+            )
+            for message_id, message in batch:
+                await dispatch(message_id, message)
 
+        def stop_lanes() -> None:
+            # The lease is about to lapse, after which the next holder claims
+            # every pending message. Handlers still running here would run
+            # alongside it, so they are cancelled and their transactions
+            # rolled back instead.
+            for task in lane_tasks:
+                task.cancel()
+
+        lease_task = asyncio.create_task(
+            self._keep_lease(lease_key, consumer_name, lease, stop_lanes)
+        )
+        reading = False
+        try:
+            while not self._stopping.is_set() and not failures:
+                if not lease.is_set():
+                    if reading:
+                        logger.warning(
+                            f"Lost the lease on {stream} for {consumer_group}"
+                        )
+                        reading = False
+                    # Lanes were cancelled as the lease lapsed; wait for them
+                    # to unwind, then for the lease to come back.
+                    await asyncio.gather(*lane_tasks, return_exceptions=True)
                     try:
-                        payload = MessagePayloadSchema.model_validate(
-                            redis_message.payload
+                        await asyncio.wait_for(lease.wait(), timeout=1)
+                    except TimeoutError:
+                        pass
+                    continue
+
+                if not reading:
+                    # Messages read but not acked by the previous holder come
+                    # before anything new on the stream.
+                    reading = True
+                    start_id = "0-0"
+                    while True:
+                        start_id, claimed, *_ = await commands.xautoclaim(
+                            stream,
+                            consumer_group,
+                            consumer_name,
+                            min_idle_time=0,
+                            start_id=start_id,
+                            count=concurrency,
                         )
+                        await dispatch_batch(claimed)
+                        if start_id == b"0-0":
+                            break
+
+                response = await redis.xreadgroup(
+                    groupname=consumer_group,
+                    consumername=consumer_name,
+                    streams={stream: ">"},
+                    block=1000,
+                    count=concurrency,
+                )
+                if not response:
+                    continue
 
-                        async with AsyncSession(engine) as session:
-                            await func(payload, session)
-
-                            handler_log = HandledMessage(
-                                message_id=redis_message.id,
-                                handler_name=func.__name__,
-                            )
-                            session.add(handler_log)
-                            await session.commit()
-                        # Ack only after successful handling and DB commit
-                        await redis.xack(self._stream, consumer_group, message_id)
-                    except Exception as e:
-                        logger.exception(f"Error processing event {e}")
-                        raise e
+                await dispatch_batch(response[0][1])
 
-            self._handlers[MessagePayloadSchema.__name__] = handler
+            # Let lanes finish what has already been read before returning.
+            await asyncio.gather(*lane_tasks, return_exceptions=True)
+        finally:
+            for task in lane_tasks:
+                task.cancel()
+            await asyncio.gather(*lane_tasks, return_exceptions=True)
+            lease_task.cancel()
+            await asyncio.gather(lease_task, return_exceptions=True)
+            try:
+                release = commands.register_script(RELEASE_SCRIPT)
+                await release(keys=[lease_key], args=[consumer_name])
+            except RedisError:
+                logger.exception(f"Failed to release the lease on {stream}")
 
-            return func
+        if failures:
+            raise failures[0]
 
-        return decorator
+    async def _keep_lease(
+        self,
+        key: str,
+        owner: str,
+        lease: asyncio.Event,
+        on_lost: Callable[[], None],
+    ) -> None:
+        script = self._get_command_redis().register_script(LEASE_SCRIPT)
+        loop = asyncio.get_running_loop()
+        expires_at = 0.0
+        while not self._stopping.is_set():
+            # Counted from before the renewal is sent, so the lease ends here
+            # no later than in Redis. A renewal still unanswered by then has
+            # failed, and on_lost runs before anyone else can take over.
+            started = loop.time()
+            timeout = expires_at - started if lease.is_set() else self._lease_seconds
+            try:
+                held = await asyncio.wait_for(
+                    script(keys=[key], args=[owner, int(self._lease_seconds * 1000)]),
+                    timeout=max(timeout, 0),
+                )
+            except RedisError:
+                logger.exception(f"Failed to renew the lease {key}")
+                held = False
+            except TimeoutError:
+                logger.warning(f"Renewing the lease {key} timed out")
+                held = False
+            if held:
+                expires_at = started + self._lease_seconds
+                lease.set()
+            elif lease.is_set():
+                lease.clear()
+                on_lost()
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(), timeout=self._lease_seconds / 3
+                )
+            except TimeoutError:
+                pass
+
+    async def _load_versions(
+        self,
+        handler_name: str,
+        messages: list[Message],
+        versions: _EntityVersions,
+        reload: bool,
+    ) -> None:
+        # One query per batch for the entities this handler has not seen
+        # yet, so that redeliveries and versions handled before a restart or
+        # takeover are recognised. Replays are read apart from the live
+        # stream, which another process may be handling, so theirs are
+        # always looked up.
+        entities = {
+            message.entity
+            for message in messages
+            if message.entity is not None
+            and message.version is not None
+            and (reload or versions.get(message.entity) is None)
+        }
+        if not entities:
+            return
+        async with AsyncSession(self._get_engine()) as session:
+            statement = (
+                select(HandledMessage.entity, func.max(HandledMessage.version))
+                .where(
+                    col(HandledMessage.handler_name) == handler_name,
+                    col(HandledMessage.entity).in_(entities),
+                )
+                .group_by(col(HandledMessage.entity))
+            )
+            for entity, version in (await session.exec(statement)).all():
+                versions.observe(entity, version)
+
+    def _is_stale(self, message: Message, versions: _EntityVersions) -> bool:
+        if message.entity is None or message.version is None:
+            return False
+        latest = versions.get(message.entity)
+        if latest is None:
+            return False
+        # A replay of the latest handled version is still wanted.
+        if message.replay:
+            return message.version < latest
+        return message.version <= latest
+
+    async def _is_handled(self, handler_name: str, message: Message) -> bool:
+        async with AsyncSession(self._get_engine()) as session:
+            handled = await session.get(HandledMessage, (message.id, handler_name))
+        return handled is not None
+
+    async def _handle(
+        self,
+        func: AsyncFunction,
+        schema: type[BaseModel],
+        max_attempts: int,
+        stream: str,
+        message_id: bytes,
+        redis_message: Message,
+        versions: _EntityVersions,
+    ) -> None:
+        redis = self._get_command_redis()
+        engine = self._get_engine()
+        consumer_group = func.__name__
+
+        if redis_message.type != schema.__name__ or (
+            redis_message.handlers is not None
+            and func.__name__ not in redis_message.handlers
+        ):
+            # Not our message; ack and continue so this group doesn't
+            # get stuck, but remember its version so that older messages for
+            # the same entity are recognised as stale.
+            versions.observe(redis_message.entity, redis_message.version)
+            await redis.xack(stream, consumer_group, message_id)
+            return
+
+        if self._is_stale(redis_message, versions):
+            HANDLER_STALE.labels(handler=func.__name__).inc()
+            logger.info(
+                f"Skipping stale message {redis_message.id} for "
+                f"{redis_message.entity} version {redis_message.version}"
+            )
+            await redis.xack(stream, consumer_group, message_id)
+            return
+
+        trace_id = redis_message.id
+        trace = redis_message.trace
+        trace.stream_id = bytes(message_id).decode()
+        attributes: dict[str, str | None] = {
+            "handler": func.__name__,
+            "stream": stream,
+            "stream_id": trace.stream_id,
+            "request_id": trace.request_id,
+        }
+        if trace.published_at is not None:
+            record_span(
+                trace_id, "stream_wait", trace.published_at, attributes=attributes
+            )
+
+        for attempt in range(1, max_attempts + 1):
+            started = time.perf_counter()
+            try:
+                payload = schema.model_validate(redis_message.payload)
+
+                async with AsyncSession(engine) as session:
+                    with span(trace_id, "handler", attributes=attributes):
+                        await func(payload, session)
+
+                    handler_log = HandledMessage(
+                        message_id=redis_message.id,
+                        handler_name=func.__name__,
+                        entity=redis_message.entity,
+                        version=redis_message.version,
+                    )
+                    session.add(handler_log)
+                    with span(trace_id, "commit", attributes=attributes):
+                        await session.commit()
+                break
+            except Exception as e:
+                if isinstance(e, IntegrityError) and await self._is_handled(
+                    func.__name__, redis_message
+                ):
+                    # Redelivered after an earlier commit that was never
+                    # acked; the handler's repeated work was rolled back.
+                    logger.info(f"Message {redis_message.id} was already handled")
+                    break
+                HANDLER_ERRORS.labels(handler=func.__name__).inc()
+                if attempt == max_attempts:
+                    logger.exception(f"Error processing event {e}")
+                    raise e
+                HANDLER_RETRIES.labels(handler=func.__name__).inc()
+                logger.warning(f"Retrying event after attempt {attempt} failed: {e}")
+                await asyncio.sleep(0.1 * 2**attempt)
+            finally:
+                HANDLER_LATENCY.labels(handler=func.__name__).observe(
+                    time.perf_counter() - started
+                )
+
+        versions.observe(redis_message.entity, redis_message.version)
+        # Ack only after successful handling and DB commit. A failed ack
+        # leaves the message pending rather than running the handler again.
+        try:
+            with span(trace_id, "ack", attributes=attributes):
+                await redis.xack(stream, consumer_group, message_id)
+        except RedisError:
+            logger.exception(f"Failed to ack message {redis_message.id}")
+            return
+        if trace.created_at is not None:
+            record_span(trace_id, "end_to_end", trace.created_at, attributes=attributes)
+
+    async def _monitor_streams(self, interval: float = 5) -> None:
+        redis = self._get_command_redis()
+        while not self._stopping.is_set():
+            for stream in [*self._streams, *self._backfill_streams]:
+                try:
+                    length = await redis.xlen(stream)
+                    STREAM_LENGTH.labels(stream=stream).set(length)
+                    for group in await redis.xinfo_groups(stream):
+                        name = group["name"].decode()
+                        if name not in self._groups:
+                            continue
+                        labels = {"stream": stream, "group": name}
+                        STREAM_GROUP_PENDING.labels(**labels).set(group["pending"])
+                        # Redis reports no lag when it cannot be computed cheaply.
+                        if group.get("lag") is not None:
+                            STREAM_GROUP_LAG.labels(**labels).set(group["lag"])
+                except ResponseError:
+                    # The stream does not exist until the first group is created.
+                    pass
+                except RedisError as e:
+                    logger.warning(f"Stream check failed for {stream}: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except TimeoutError:
+                pass
+
+    async def _prune_handled_messages(
+        self, retention_seconds: float, interval: float = 60, batch_size: int = 1000
+    ) -> None:
+        # Deleted in batches so that no statement holds many row locks for
+        # long, skipping rows another process is already deleting.
+        engine = self._get_engine()
+        while not self._stopping.is_set():
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=retention_seconds)
+            expired = (
+                select(col(HandledMessage.message_id), col(HandledMessage.handler_name))
+                .where(col(HandledMessage.created_at) < cutoff)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            statement = delete(HandledMessage).where(
+                tuple_(
+                    col(HandledMessage.message_id), col(HandledMessage.handler_name)
+                ).in_(expired)
+            )
+            try:
+                deleted = batch_size
+                while deleted == batch_size and not self._stopping.is_set():
+                    async with AsyncSession(engine) as session:
+                        result = await session.execute(statement)
+                        await session.commit()
+                    deleted = cast(CursorResult[Any], result).rowcount
+            except DBAPIError as e:
+                logger.warning(f"Pruning handled messages failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except TimeoutError:
+                pass
 
     def start(self) -> None:
         if self._engine is None or self._redis is None:
             raise ValueError("Engine and Redis must be set before starting.")
+        streams = [*self._streams, *self._backfill_streams]
+        readers = len(self._handlers) * len(streams)
+        max_connections = self._redis.connection_pool.max_connections
+        if readers > max_connections:
+            raise ValueError(
+                f"{len(self._handlers)} handlers reading {len(streams)} streams "
+                f"need {readers} Redis connections, but the pool allows "
+                f"{max_connections}."
+            )
+        self._stopping.clear()
         for handler in self._handlers.values():
-            task: asyncio.Task[None] = asyncio.create_task(handler())
-            self._tasks.append(task)
+            for stream in streams:
+                task: asyncio.Task[None] = asyncio.create_task(handler(stream))
+                self._tasks.append(task)
+        self._tasks.append(asyncio.create_task(self._monitor_streams()))
+        if self._handled_retention_seconds is not None:
+            self._tasks.append(
+                asyncio.create_task(
+                    self._prune_handled_messages(self._handled_retention_seconds)
+                )
+            )
+
+    async def wait(self) -> None:
+        # Returns once a task ends before stop() is called, raising what it
+        # failed with, such as a handler that ran out of attempts.
+        if not self._tasks:
+            return
+        done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
 
-    async def stop(self) -> None:
-        for task in self._tasks:
-            task.cancel()
-        await asyncio.gather(*self._tasks, return_exceptions=True)
+    async def stop(self, timeout: float = 10) -> None:
+        # Handlers finish the message they are processing and exit after
+        # their current blocking read; cancel whatever is left after the
+        # timeout.
+        self._stopping.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -1,13 +1,23 @@
 from typing import Any
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from digestify_topics.tracing import TraceContext
 
 
 class Message(BaseModel):
     id: str
     type: str
     payload: dict[str, Any]
+    entity: str | None = None
+    version: int | None = None
+    # Set on messages re-emitted by a backfill. A replay is handled again even
+    # if its version was already handled, and only by the named handlers if
+    # there are any.
+    replay: bool = False
+    handlers: list[str] | None = None
+    trace: TraceContext = Field(default_factory=TraceContext)
 
 
 class TopicCreated(BaseModel):
@@ -0,0 +1,149 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+)
+
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool.",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+
+REDIS_POOL_WAIT = Histogram(
+    "redis_pool_wait_seconds",
+    "Time spent waiting for a Redis connection from the pool.",
+    ["role"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5),
+)
+
+# Gauges are measured independently by each process. With several API
+# processes sharing PROMETHEUS_MULTIPROC_DIR, a scrape reports the latest one.
+OUTBOX_BACKLOG = Gauge(
+    "outbox_backlog_messages",
+    "Number of messages waiting in the outbox.",
+    multiprocess_mode="mostrecent",
+)
+
+OUTBOX_OLDEST_AGE = Gauge(
+    "outbox_oldest_message_age_seconds",
+    "Age of the oldest message waiting in the outbox.",
+    multiprocess_mode="mostrecent",
+)
+
+PUBLISH_BATCH_SIZE = Histogram(
+    "outbox_publish_batch_size",
+    "Number of messages published per outbox batch.",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+PUBLISH_BATCH_DURATION = Histogram(
+    "outbox_publish_batch_duration_seconds",
+    "Time spent claiming, publishing and deleting one outbox batch.",
+)
+
+STREAM_LENGTH = Gauge(
+    "stream_length_messages",
+    "Number of entries in the stream.",
+    ["stream"],
+    multiprocess_mode="mostrecent",
+)
+
+STREAM_GROUP_LAG = Gauge(
+    "stream_group_lag_messages",
+    "Entries in the stream not yet delivered to the consumer group.",
+    ["stream", "group"],
+    multiprocess_mode="mostrecent",
+)
+
+STREAM_GROUP_PENDING = Gauge(
+    "stream_group_pending_messages",
+    "Entries delivered to the consumer group but not yet acknowledged.",
+    ["stream", "group"],
+    multiprocess_mode="mostrecent",
+)
+
+HANDLER_LATENCY = Histogram(
+    "handler_duration_seconds",
+    "Time spent handling one message, including the commit.",
+    ["handler"],
+)
+
+HANDLER_ERRORS = Counter(
+    "handler_errors_total",
+    "Messages whose handling raised an exception.",
+    ["handler"],
+)
+
+HANDLER_RETRIES = Counter(
+    "handler_retries_total",
+    "Handling attempts retried after an exception.",
+    ["handler"],
+)
+
+OPENAI_LATENCY = Histogram(
+    "openai_request_duration_seconds",
+    "OpenAI API call latency.",
+    ["operation", "model", "outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total",
+    "OpenAI tokens used.",
+    ["operation", "model", "kind"],
+)
+
+EVENT_STAGE_DURATION = Histogram(
+    "event_stage_duration_seconds",
+    "Time an event spends in each stage between commit and acknowledgement.",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+
+HANDLER_STALE = Counter(
+    "handler_stale_messages_total",
+    "Messages skipped because a newer version of their entity was handled.",
+    ["handler"],
+)
+
+MODERATION_LATENCY = Histogram(
+    "moderation_duration_seconds",
+    "Topic moderation latency by the tier that decided and its verdict.",
+    ["tier", "verdict"],
+    buckets=(0.00001, 0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+MODERATION_REMOTE_FAILURES = Counter(
+    "moderation_remote_failures_total",
+    "Remote moderation checks that timed out or failed.",
+    ["reason"],
+)
+
+RATE_LIMIT_REJECTIONS = Counter(
+    "rate_limit_rejections_total",
+    "Requests rejected by a rate limit.",
+    ["route", "backend"],
+)
+
+RATE_LIMIT_FALLBACKS = Counter(
+    "rate_limit_fallbacks_total",
+    "Rate limit checks answered locally because Redis was slow or failing.",
+    ["reason"],
+)
+
+BACKFILL_EMITTED = Counter(
+    "backfill_messages_total",
+    "Messages re-emitted by a backfill.",
+    ["name"],
+)
+
+BACKFILL_BACKLOG = Gauge(
+    "backfill_backlog_messages",
+    "Backfill messages not yet acknowledged by the slowest consumer group.",
+    ["name"],
+    multiprocess_mode="mostrecent",
+)
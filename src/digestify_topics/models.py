@@ -2,26 +2,27 @@ from datetime import datetime, timezone
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel
+from sqlalchemy import JSON, BigInteger, Column, Identity, Index, Integer, text
 from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP
 from sqlmodel import Field, SQLModel
 
+from digestify_topics.tracing import get_request_id
+
 
 class Entity(SQLModel):
     id: UUID = Field(primary_key=True, default_factory=uuid4)
-    discarded: bool = Field(nullable=False, index=True, default=False)
+    discarded: bool = Field(nullable=False, default=False)
     created_at: datetime = Field(
         nullable=False,
         sa_type=TIMESTAMP(timezone=True),  # type: ignore
-        index=True,
         default_factory=lambda: datetime.now(timezone.utc),
     )
     updated_at: datetime = Field(
         nullable=False,
         sa_type=TIMESTAMP(timezone=True),  # type: ignore
-        index=True,
         default_factory=lambda: datetime.now(timezone.utc),
     )
-    version: int = Field(nullable=False, index=True, default=0)
+    version: int = Field(nullable=False, default=0)
 
     def increment_version(self):
         if self.version == 0:
@@ -33,32 +34,58 @@ class Entity(SQLModel):
 
 class Topic(Entity, table=True):
     __tablename__ = "topics"
+    __table_args__ = (
+        # Serves /my_topics, which only ever lists a user's active topics.
+        Index(
+            "ix_topics_user_id_active",
+            "user_id",
+            postgresql_where=text("NOT discarded"),
+        ),
+        # Serves /topics/changes, which pages through a user's topics,
+        # discarded ones included, in (updated_at, id) order.
+        Index("ix_topics_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
     name: str = Field(nullable=False)
     description: str = Field(nullable=False)
-    user_id: UUID = Field(nullable=False, index=True)
-    is_public: bool = Field(nullable=False, index=True)
-    locale: str = Field(nullable=False, index=True)
+    user_id: UUID = Field(nullable=False)
+    is_public: bool = Field(nullable=False)
+    locale: str = Field(nullable=False)
     image_uri: str | None = Field(nullable=True, default=None)
 
 
 class User(Entity, table=True):
     __tablename__ = "users"
-    created_topic_count: int = Field(nullable=False, index=True, default=0)
+    created_topic_count: int = Field(nullable=False, default=0)
 
 
 class OutboxMessage(SQLModel, table=True):
     __tablename__ = "outbox_messages"
-    id: UUID = Field(primary_key=True, default_factory=uuid4)
-    type: str = Field(nullable=False, index=True)
-    entity: str | None = Field(nullable=True, index=True)
-    payload: dict = Field(sa_type=JSONB, nullable=False)
+    __table_args__ = {"postgresql_partition_by": "RANGE (sequence)"}
+    # Assigned by the database on insert. Unlike created_at it never ties and
+    # never goes backwards across app servers, so it orders and partitions the
+    # outbox. SQLite, used by the tests, only autoincrements INTEGER keys.
+    sequence: int | None = Field(
+        default=None,
+        sa_column=Column(
+            BigInteger().with_variant(Integer(), "sqlite"),
+            Identity(),
+            primary_key=True,
+        ),
+    )
+    id: UUID = Field(nullable=False, default_factory=uuid4)
+    type: str = Field(nullable=False)
+    entity: str | None = Field(nullable=True)
+    payload: dict = Field(
+        sa_type=JSONB().with_variant(JSON(), "sqlite"),  # type: ignore
+        nullable=False,
+    )
     created_at: datetime = Field(
         nullable=False,
         sa_type=TIMESTAMP(timezone=True),  # type: ignore
-        index=True,
         default_factory=lambda: datetime.now(timezone.utc),
     )
-    version: int | None = Field(nullable=True, index=True)
+    version: int | None = Field(nullable=True)
+    request_id: str | None = Field(nullable=True, default=None)
 
     @classmethod
     def from_payload(
@@ -72,16 +99,28 @@ class OutboxMessage(SQLModel, table=True):
             entity=entity,
             payload=payload.model_dump(mode="json"),
             version=version,
+            request_id=get_request_id(),
         )
 
 
 class HandledMessage(SQLModel, table=True):
     __tablename__ = "handled_messages"
+    __table_args__ = (
+        Index(
+            "ix_handled_messages_entity_handler_name_version",
+            "entity",
+            "handler_name",
+            "version",
+        ),
+        # Serves the dispatcher's pruning of old rows.
+        Index("ix_handled_messages_created_at", "created_at"),
+    )
     message_id: str = Field(primary_key=True)
     handler_name: str = Field(primary_key=True)
+    entity: str | None = Field(nullable=True, default=None)
+    version: int | None = Field(nullable=True, default=None)
     created_at: datetime = Field(
         nullable=False,
         sa_type=TIMESTAMP(timezone=True),  # type: ignore
-        index=True,
         default_factory=lambda: datetime.now(timezone.utc),
     )
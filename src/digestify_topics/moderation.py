@@ -0,0 +1,271 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from collections.abc import Iterable
+from enum import StrEnum
+from typing import override
+
+from redis.exceptions import RedisError
+
+from digestify_topics.metrics import MODERATION_LATENCY, MODERATION_REMOTE_FAILURES
+from digestify_topics.settings import Settings, get_settings
+from digestify_topics.stream import RedisRole, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class Verdict(StrEnum):
+    ALLOWED = "allowed"
+    BLOCKED = "blocked"
+    AMBIGUOUS = "ambiguous"
+
+
+_ZERO_WIDTH = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff\u00ad"))
+_LEET = str.maketrans("013457@$", "oieastas")
+_WHITESPACE = re.compile(r"\s+")
+_URL = re.compile(r"https?://|www\.", re.IGNORECASE)
+_REPEATED = re.compile(r"(.)\1{5,}")
+# Zero-width characters and full-width Latin letters are rare in real text but
+# common in text written to get past a keyword filter.
+_OBFUSCATION = re.compile(
+    "[\u200b\u200c\u200d\u2060\ufeff\u00ad\uff21-\uff3a\uff41-\uff5a]"
+)
+
+
+def normalize(text: str) -> str:
+    # Folds the usual obfuscations (width and compatibility forms, case,
+    # zero-width characters, digit and symbol substitutions) so that both
+    # keyword matching and the verdict cache see one form of the text.
+    text = unicodedata.normalize("NFKC", text).translate(_ZERO_WIDTH).casefold()
+    return _WHITESPACE.sub(" ", text.translate(_LEET)).strip()
+
+
+class KeywordAutomaton:
+    # Aho-Corasick: finds every keyword in a single pass over the text,
+    # however many keywords there are.
+    def __init__(self, keywords: Iterable[str]) -> None:
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._output: list[list[str]] = [[]]
+        for keyword in keywords:
+            self._add(normalize(keyword))
+        self._build()
+
+    def _add(self, keyword: str) -> None:
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append(keyword)
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def search(self, text: str) -> set[str]:
+        # Only whole words match, so that "class" does not match "ass".
+        found = set()
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for keyword in self._output[state]:
+                start = index - len(keyword) + 1
+                end = index + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end == len(text) or not text[end].isalnum()
+                ):
+                    found.add(keyword)
+        return found
+
+
+class Prefilter:
+    def __init__(
+        self, blocked_terms: Iterable[str], review_terms: Iterable[str]
+    ) -> None:
+        # One automaton for both lists, so the text is scanned once.
+        self._blocked = {normalize(term) for term in blocked_terms}
+        self._terms = KeywordAutomaton([*self._blocked, *review_terms])
+
+    def check(self, text: str, normalized: str) -> Verdict:
+        found = self._terms.search(normalized)
+        if found & self._blocked:
+            return Verdict.BLOCKED
+        if found:
+            return Verdict.AMBIGUOUS
+        # Signs of spam or of obfuscation.
+        if (
+            _URL.search(normalized)
+            or _REPEATED.search(normalized)
+            or _OBFUSCATION.search(text)
+        ):
+            return Verdict.AMBIGUOUS
+        letters = [char for char in text if char.isalpha()]
+        uppercase = sum(char.isupper() for char in letters)
+        if len(letters) > 20 and uppercase > 0.7 * len(letters):
+            return Verdict.AMBIGUOUS
+        return Verdict.ALLOWED
+
+
+class RemoteModerator(ABC):
+    @abstractmethod
+    async def is_flagged(self, text: str) -> bool: ...
+
+
+class OpenAIModerator(RemoteModerator):
+    @override
+    async def is_flagged(self, text: str) -> bool:
+        from digestify_topics.ai import create_moderation
+
+        return await create_moderation(text)
+
+
+class VerdictCache(ABC):
+    @abstractmethod
+    async def get(self, key: str) -> Verdict | None: ...
+
+    @abstractmethod
+    async def set(self, key: str, verdict: Verdict) -> None: ...
+
+
+class RedisVerdictCache(VerdictCache):
+    def __init__(self, ttl_seconds: int) -> None:
+        self._ttl_seconds = ttl_seconds
+
+    @override
+    async def get(self, key: str) -> Verdict | None:
+        try:
+            value = await get_redis(RedisRole.CACHE).get(f"moderation:{key}")
+        except RedisError:
+            logger.exception("Failed to read moderation verdict")
+            return None
+        return None if value is None else Verdict(value.decode())
+
+    @override
+    async def set(self, key: str, verdict: Verdict) -> None:
+        try:
+            await get_redis(RedisRole.CACHE).set(
+                f"moderation:{key}", verdict.value, ex=self._ttl_seconds
+            )
+        except RedisError:
+            logger.exception("Failed to store moderation verdict")
+
+
+class InMemoryVerdictCache(VerdictCache):
+    def __init__(self, max_size: int = 10_000) -> None:
+        self._verdicts: OrderedDict[str, Verdict] = OrderedDict()
+        self._max_size = max_size
+
+    @override
+    async def get(self, key: str) -> Verdict | None:
+        verdict = self._verdicts.get(key)
+        if verdict is not None:
+            self._verdicts.move_to_end(key)
+        return verdict
+
+    @override
+    async def set(self, key: str, verdict: Verdict) -> None:
+        self._verdicts[key] = verdict
+        self._verdicts.move_to_end(key)
+        if len(self._verdicts) > self._max_size:
+            self._verdicts.popitem(last=False)
+
+
+class ModerationEngine:
+    # Tiers, cheapest first: the local prefilter settles clear cases, the
+    # cache answers text that was seen before, and only the remaining
+    # ambiguous text goes to the remote model under a timeout.
+    def __init__(
+        self,
+        prefilter: Prefilter,
+        cache: VerdictCache,
+        remote: RemoteModerator | None = None,
+        timeout: float = 0.5,
+        fail_open: bool = True,
+    ) -> None:
+        self._prefilter = prefilter
+        self._cache = cache
+        self._remote = remote
+        self._timeout = timeout
+        self._fail_open = fail_open
+
+    async def check(self, text: str) -> Verdict:
+        started = time.perf_counter()
+        tier, verdict = await self._check(text)
+        MODERATION_LATENCY.labels(tier=tier, verdict=verdict).observe(
+            time.perf_counter() - started
+        )
+        return verdict
+
+    async def _check(self, text: str) -> tuple[str, Verdict]:
+        normalized = normalize(text)
+        verdict = self._prefilter.check(text, normalized)
+        if verdict != Verdict.AMBIGUOUS or self._remote is None:
+            return "prefilter", verdict
+
+        key = hashlib.sha256(normalized.encode()).hexdigest()
+        cached = await self._cache.get(key)
+        if cached is not None:
+            return "cache", cached
+
+        try:
+            async with asyncio.timeout(self._timeout):
+                flagged = await self._remote.is_flagged(text)
+        except TimeoutError:
+            MODERATION_REMOTE_FAILURES.labels(reason="timeout").inc()
+            return "policy", self._policy_verdict()
+        except Exception:
+            logger.exception("Remote moderation failed")
+            MODERATION_REMOTE_FAILURES.labels(reason="error").inc()
+            return "policy", self._policy_verdict()
+        verdict = Verdict.BLOCKED if flagged else Verdict.ALLOWED
+        # Policy verdicts are not cached, so that the text is checked again
+        # once the remote model is reachable.
+        await self._cache.set(key, verdict)
+        return "remote", verdict
+
+    def _policy_verdict(self) -> Verdict:
+        return Verdict.ALLOWED if self._fail_open else Verdict.BLOCKED
+
+
+def create_moderation_engine(settings: Settings) -> ModerationEngine:
+    return ModerationEngine(
+        prefilter=Prefilter(
+            settings.moderation_blocked_terms, settings.moderation_review_terms
+        ),
+        cache=RedisVerdictCache(settings.moderation_cache_seconds),
+        remote=OpenAIModerator() if settings.moderation_remote_enabled else None,
+        timeout=settings.moderation_timeout,
+        fail_open=settings.moderation_fail_open,
+    )
+
+
+_moderation_engine: ModerationEngine | None = None
+
+
+def get_moderation_engine() -> ModerationEngine:
+    # Built on first use; the keyword automatons are compiled once per process.
+    global _moderation_engine
+    if _moderation_engine is None:
+        _moderation_engine = create_moderation_engine(get_settings())
+    return _moderation_engine
@@ -1,12 +1,112 @@
 import asyncio
+import logging
+import re
+import time
+from datetime import datetime, timezone
 
 from redis.asyncio import Redis
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio.engine import AsyncEngine
-from sqlmodel import col, select
+from sqlmodel import col, func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from digestify_topics.messages import Message
+from digestify_topics.metrics import (
+    OUTBOX_BACKLOG,
+    OUTBOX_OLDEST_AGE,
+    PUBLISH_BATCH_DURATION,
+    PUBLISH_BATCH_SIZE,
+)
 from digestify_topics.models import OutboxMessage
+from digestify_topics.stream import shard_index, stream_shards
+from digestify_topics.tracing import TraceContext, record_span
+
+logger = logging.getLogger(__name__)
+
+_PARTITION_NAME = re.compile(r"^outbox_messages_(\d+)_(\d+)$")
+
+
+async def rotate_outbox_partitions(
+    engine: AsyncEngine, size: int, ahead: int = 2
+) -> None:
+    # Rows land in the default partition until a range partition covers
+    # their sequence. Range partitions are created ahead of the sequence,
+    # so they never overlap rows already in the default partition, and
+    # dropped once their whole range has been allocated and published.
+    # Dropping discards their dead tuples at once instead of leaving them
+    # to vacuum. New partitions copy the storage parameters the migrations
+    # set on the default partition.
+    async with engine.connect() as connection:
+        current = await connection.scalar(
+            text(
+                "SELECT coalesce(pg_sequence_last_value("
+                "pg_get_serial_sequence('outbox_messages', 'sequence')), 0)"
+            )
+        )
+        result = await connection.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = 'outbox_messages'::regclass"
+            )
+        )
+        partitions = []
+        for name in result.scalars():
+            if match := _PARTITION_NAME.match(name):
+                partitions.append((int(match[1]), int(match[2])))
+        parameters = await connection.scalar(
+            text(
+                "SELECT array_to_string(reloptions, ', ') FROM pg_class"
+                " WHERE oid = 'outbox_messages_default'::regclass"
+            )
+        )
+        await connection.commit()
+
+        for start, end in partitions:
+            if end > current + 1:
+                continue
+            name = f"outbox_messages_{start}_{end}"
+            try:
+                async with connection.begin():
+                    # Fail fast rather than queue behind, and in front of,
+                    # the publishers' claims. Only the partition is locked
+                    # while it is checked. The drop must also lock the
+                    # parent, but only until the commit right after it.
+                    # DETACH CONCURRENTLY is not allowed next to a default
+                    # partition.
+                    await connection.execute(text("SET LOCAL lock_timeout = '100ms'"))
+                    await connection.execute(
+                        text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE")
+                    )
+                    if await connection.scalar(
+                        text(f"SELECT EXISTS (SELECT 1 FROM {name})")
+                    ):
+                        continue
+                    await connection.execute(text(f"DROP TABLE {name}"))
+                logger.info(f"Dropped drained outbox partition {name}")
+            except DBAPIError as e:
+                logger.warning(f"Could not drop outbox partition {name}: {e}")
+
+        first = (current // size + 1) * size
+        for start in range(first, first + ahead * size, size):
+            end = start + size
+            if any(s < end and start < e for s, e in partitions):
+                continue
+            name = f"outbox_messages_{start}_{end}"
+            try:
+                async with connection.begin():
+                    await connection.execute(text("SET LOCAL lock_timeout = '100ms'"))
+                    await connection.execute(
+                        text(
+                            f"CREATE TABLE {name} PARTITION OF outbox_messages"
+                            f" FOR VALUES FROM ({start}) TO ({end})"
+                            + (f" WITH ({parameters})" if parameters else "")
+                        )
+                    )
+                logger.info(f"Created outbox partition {name}")
+            except DBAPIError as e:
+                logger.warning(f"Could not create outbox partition {name}: {e}")
 
 
 class OutboxPublisher:
@@ -17,46 +117,139 @@ class OutboxPublisher:
         engine: AsyncEngine,
         redis: Redis,
         stream: str,
+        batch_size: int = 10,
+        partition_size: int = 0,
+        shard_count: int = 1,
     ) -> None:
         self._engine = engine
         self._redis = redis
-        self._stream = stream
+        self._shards = stream_shards(stream, shard_count)
+        self._batch_size = batch_size
+        self._partition_size = partition_size
         self._tasks = []
+        self._stopping = asyncio.Event()
+
+    async def _observe_backlog(self) -> None:
+        async with AsyncSession(self._engine) as session:
+            statement = select(func.count()).select_from(OutboxMessage)
+            count = (await session.exec(statement)).one()
+            # The oldest row is the first by sequence, found through the
+            # primary key; created_at has no index.
+            oldest_statement = (
+                select(OutboxMessage.created_at)
+                .order_by(col(OutboxMessage.sequence))
+                .limit(1)
+            )
+            oldest = (await session.exec(oldest_statement)).first()
+        OUTBOX_BACKLOG.set(count)
+        if oldest is None:
+            OUTBOX_OLDEST_AGE.set(0)
+        else:
+            OUTBOX_OLDEST_AGE.set((datetime.now(timezone.utc) - oldest).total_seconds())
+
+    async def _monitor_backlog(self, interval: float = 1) -> None:
+        # A single task for all publishers, so that the outbox is counted
+        # once per interval however many publishers run.
+        while not self._stopping.is_set():
+            try:
+                await self._observe_backlog()
+            except DBAPIError as e:
+                logger.warning(f"Outbox backlog check failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except TimeoutError:
+                pass
 
-    async def _publish_messages(self, limit: int = 10) -> None:
-        while True:
+    async def _publish_messages(self) -> None:
+        while not self._stopping.is_set():
+            started = time.perf_counter()
             async with AsyncSession(self._engine) as session:
                 statement = (
                     select(OutboxMessage)
-                    .order_by(col(OutboxMessage.created_at))
-                    .limit(limit)
+                    .order_by(col(OutboxMessage.sequence))
+                    .limit(self._batch_size)
                     .with_for_update(skip_locked=True)
                 )
                 result = await session.exec(statement)
                 messages = result.all()
+                claimed_at = datetime.now(timezone.utc)
 
                 for message in messages:
+                    trace_id = str(message.id)
+                    record_span(trace_id, "outbox_wait", message.created_at, claimed_at)
+                    published_at = datetime.now(timezone.utc)
                     redis_message = Message(
-                        id=str(message.id),
+                        id=trace_id,
                         type=message.type,
                         payload=message.payload,
+                        entity=message.entity,
+                        version=message.version,
+                        trace=TraceContext(
+                            request_id=message.request_id,
+                            created_at=message.created_at,
+                            published_at=published_at,
+                        ),
                     )
+                    # Messages of one entity always go to the same shard, so
+                    # they stay in order.
+                    shard = self._shards[
+                        shard_index(message.entity or trace_id, len(self._shards))
+                    ]
                     await self._redis.xadd(
-                        self._stream, {"data": redis_message.model_dump_json()}
+                        shard, {"data": redis_message.model_dump_json()}
                     )
+                    record_span(trace_id, "publish", published_at)
 
                 for message in messages:
                     await session.delete(message)
 
                 await session.commit()
-            await asyncio.sleep(1)
+            PUBLISH_BATCH_DURATION.observe(time.perf_counter() - started)
+            PUBLISH_BATCH_SIZE.observe(len(messages))
+            if len(messages) == self._batch_size:
+                # A full batch means more are likely waiting; skip the poll delay.
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=1)
+            except TimeoutError:
+                pass
+
+    async def _rotate_partitions(self, interval: float = 10) -> None:
+        while not self._stopping.is_set():
+            try:
+                await rotate_outbox_partitions(self._engine, self._partition_size)
+            except DBAPIError as e:
+                logger.warning(f"Outbox partition rotation failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except TimeoutError:
+                pass
 
     def start(self, publisher_count: int = 1) -> None:
+        self._stopping.clear()
         for _ in range(publisher_count):
             task: asyncio.Task[None] = asyncio.create_task(self._publish_messages())
             self._tasks.append(task)
+        self._tasks.append(asyncio.create_task(self._monitor_backlog()))
+        if self._partition_size > 0:
+            self._tasks.append(asyncio.create_task(self._rotate_partitions()))
+
+    async def wait(self) -> None:
+        # Returns once a task ends before stop() is called, raising what it
+        # failed with, such as a Redis error in the middle of a batch.
+        if not self._tasks:
+            return
+        done, _ = await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
 
-    async def stop(self) -> None:
-        for task in self._tasks:
-            task.cancel()
-        await asyncio.gather(*self._tasks, return_exceptions=True)
+    async def stop(self, timeout: float = 10) -> None:
+        # Let in-flight batches finish; cancel whatever is still running
+        # after the timeout.
+        self._stopping.set()
+        if self._tasks:
+            _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
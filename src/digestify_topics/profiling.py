@@ -0,0 +1,331 @@
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from types import FrameType
+from typing import Annotated, Any
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from digestify_topics.auth import Auth, get_admin_auth, verify_jwt_token
+from digestify_topics.settings import get_settings
+from digestify_topics.tracing import get_request_id
+
+MAX_STATEMENTS = 1000
+
+
+class SqlTiming(BaseModel):
+    statement: str
+    offset: float
+    duration: float
+
+
+class Profile(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: str | None
+    status: int
+    requested: bool
+    started_at: datetime
+    duration: float
+    interval: float
+    # Folded stacks, outermost frame first, as read by flamegraph.pl and
+    # speedscope, mapped to the number of samples taken in them.
+    samples: dict[str, int]
+    statements: list[SqlTiming]
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.items())
+
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    route: str | None
+    status: int
+    requested: bool
+    started_at: datetime
+    duration: float
+    sample_count: int
+    sql_count: int
+    sql_duration: float
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+class _ActiveProfile:
+    def __init__(self, root: Any, thread_id: int) -> None:
+        self.root = root
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.samples: Counter[str] = Counter()
+        self.statements: list[SqlTiming] = []
+
+    def sample(self, frames: dict[int, FrameType]) -> None:
+        # Follows the chain of awaits down from the request's coroutine, so
+        # that time spent waiting on I/O is attributed to the await it is
+        # spent in, not only time spent running on the event loop.
+        stack = []
+        awaitable = self.root
+        frame = None
+        while True:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(
+                awaitable, "gi_frame", None
+            )
+            if frame is None:
+                stack.append(f"<{type(awaitable).__name__}>")
+                break
+            stack.append(_frame_name(frame))
+            awaited = getattr(awaitable, "cr_await", None) or getattr(
+                awaitable, "gi_yieldfrom", None
+            )
+            if awaited is None:
+                break
+            awaitable = awaited
+        if getattr(awaitable, "cr_running", False):
+            # Running right now: add the synchronous calls it is making.
+            running = []
+            current = frames.get(self.thread_id)
+            while current is not None and current is not frame:
+                running.append(_frame_name(current))
+                current = current.f_back
+            stack.extend(reversed(running))
+        self.samples[";".join(stack)] += 1
+
+
+class _Sampler:
+    # A single thread samples every request being profiled, and only runs
+    # while there is at least one.
+    def __init__(self) -> None:
+        self._active: set[_ActiveProfile] = set()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._interval = 0.005
+
+    def add(self, profile: _ActiveProfile, interval: float) -> None:
+        with self._lock:
+            self._active.add(profile)
+            self._interval = interval
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: _ActiveProfile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                frames = sys._current_frames()
+                for profile in self._active:
+                    profile.sample(frames)
+                interval = self._interval
+            time.sleep(interval)
+
+
+_sampler = _Sampler()
+_active_profile: ContextVar[_ActiveProfile | None] = ContextVar(
+    "active_profile", default=None
+)
+
+
+def _before_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, *args: Any
+) -> None:
+    if _active_profile.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, *args: Any
+) -> None:
+    profile = _active_profile.get()
+    if profile is None or not conn.info.get("profile_started"):
+        return
+    started = conn.info["profile_started"].pop()
+    if len(profile.statements) < MAX_STATEMENTS:
+        profile.statements.append(
+            SqlTiming(
+                statement=statement,
+                offset=started - profile.started,
+                duration=time.perf_counter() - started,
+            )
+        )
+
+
+def install_sql_hooks() -> None:
+    # Listens on every engine; statements outside a profiled request return
+    # after one context variable lookup.
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfileStore:
+    def __init__(self, max_size: int) -> None:
+        self._profiles: deque[Profile] = deque(maxlen=max_size)
+
+    def add(self, profile: Profile) -> None:
+        self._profiles.append(profile)
+
+    def get(self, profile_id: str) -> Profile | None:
+        return next((p for p in self._profiles if p.id == profile_id), None)
+
+    def recent(self) -> list[Profile]:
+        return list(reversed(self._profiles))
+
+
+_profile_store: ProfileStore | None = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore(get_settings().profiling_buffer_size)
+    return _profile_store
+
+
+def _is_authorized(scope: Scope) -> bool:
+    settings = get_settings()
+    if settings.debug:
+        return True
+    headers = Headers(scope=scope)
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return False
+    try:
+        user_id = uuid.UUID(verify_jwt_token(token)["sub"])
+    except (HTTPException, KeyError, ValueError):
+        return False
+    return user_id in settings.admin_user_ids
+
+
+class ProfilingMiddleware:
+    # Profiles a request when an admin sends `X-Profile: 1`, or at random at
+    # `profiling_sample_rate`. Requested profiles are always kept and their
+    # id is returned in `X-Profile-ID`; sampled ones only when they take
+    # longer than `profiling_slow_seconds`. Added as the innermost middleware,
+    # so that routing and the endpoint run in the task that is sampled.
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        settings = get_settings()
+        requested = Headers(scope=scope).get("x-profile") == "1"
+        requested = requested and _is_authorized(scope)
+        if not requested and random.random() >= settings.profiling_sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = get_request_id() or uuid.uuid4().hex
+        status = 500
+
+        async def send_with_profile_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if requested:
+                    MutableHeaders(scope=message).append("X-Profile-ID", profile_id)
+            await send(message)
+
+        started_at = datetime.now(timezone.utc)
+        root = self.app(scope, receive, send_with_profile_id)
+        active = _ActiveProfile(root, threading.get_ident())
+        token = _active_profile.set(active)
+        _sampler.add(active, settings.profiling_interval)
+        try:
+            await root
+        finally:
+            _sampler.remove(active)
+            _active_profile.reset(token)
+            duration = time.perf_counter() - active.started
+            if requested or duration >= settings.profiling_slow_seconds:
+                get_profile_store().add(
+                    Profile(
+                        id=profile_id,
+                        method=scope["method"],
+                        path=scope["path"],
+                        route=getattr(scope.get("route"), "path", None),
+                        status=status,
+                        requested=requested,
+                        started_at=started_at,
+                        duration=duration,
+                        interval=settings.profiling_interval,
+                        samples=dict(active.samples),
+                        statements=active.statements,
+                    )
+                )
+
+
+profiling_router = APIRouter(prefix="/debug/profiles")
+
+
+@profiling_router.get("")
+async def list_profiles(
+    auth: Annotated[Auth, Depends(get_admin_auth)],
+) -> list[ProfileSummary]:
+    return [
+        ProfileSummary(
+            id=profile.id,
+            method=profile.method,
+            path=profile.path,
+            route=profile.route,
+            status=profile.status,
+            requested=profile.requested,
+            started_at=profile.started_at,
+            duration=profile.duration,
+            sample_count=sum(profile.samples.values()),
+            sql_count=len(profile.statements),
+            sql_duration=sum(s.duration for s in profile.statements),
+        )
+        for profile in get_profile_store().recent()
+    ]
+
+
+def _get_profile(profile_id: str) -> Profile:
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        # Profiles are kept per process, so behind several workers it may be
+        # held by another one.
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+
+@profiling_router.get("/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    auth: Annotated[Auth, Depends(get_admin_auth)],
+) -> Profile:
+    return _get_profile(profile_id)
+
+
+@profiling_router.get("/{profile_id}/folded", response_class=PlainTextResponse)
+async def get_profile_folded(
+    profile_id: str,
+    auth: Annotated[Auth, Depends(get_admin_auth)],
+) -> str:
+    return _get_profile(profile_id).folded()
@@ -2,8 +2,6 @@ from abc import ABC, abstractmethod
 from typing import override
 from uuid import UUID
 
-import aiohttp
-
 
 class Queries(ABC):
     @abstractmethod
@@ -26,6 +24,8 @@ class MockQueries(Queries):
 class HTTPQueries(Queries):
     @override
     async def check_user_subscription(self, user_id: UUID) -> bool:
+        import aiohttp
+
         url = f"/subscriptions/{user_id}"
         async with aiohttp.ClientSession() as session:
             async with session.get(url) as response:
@@ -34,4 +34,7 @@ class HTTPQueries(Queries):
 
     @override
     async def validate_topic_creation(self, name: str, description: str) -> bool:
-        return True
+        from digestify_topics.moderation import Verdict, get_moderation_engine
+
+        verdict = await get_moderation_engine().check(f"{name}\n{description}")
+        return verdict != Verdict.BLOCKED
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Annotated
+
+from fastapi import Depends, HTTPException
+from redis.exceptions import RedisError
+
+from digestify_topics.auth import Auth, get_auth
+from digestify_topics.metrics import RATE_LIMIT_FALLBACKS, RATE_LIMIT_REJECTIONS
+from digestify_topics.settings import RateLimit, get_settings
+from digestify_topics.stream import RedisRole, get_redis
+
+logger = logging.getLogger(__name__)
+
+# Refills and takes one token in a single atomic step. Redis's own clock is
+# used so that app servers with skewed clocks agree. Returns whether the
+# request is allowed and, if not, how many milliseconds until it would be.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2]) / 1000
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, retry_after}
+"""
+
+
+class LocalTokenBuckets:
+    # Per-process buckets used while Redis is unavailable. Each process then
+    # enforces the full limit on its own, so the effective limit is looser,
+    # but abusive clients are still held back.
+    def __init__(self, max_size: int = 100_000) -> None:
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._max_size = max_size
+
+    def take(self, key: str, limit: RateLimit) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+        tokens = min(
+            limit.capacity, tokens + (now - updated_at) * limit.refill_per_second
+        )
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / limit.refill_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self._max_size:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+_local_buckets = LocalTokenBuckets()
+
+
+async def _take_token(key: str, limit: RateLimit, timeout: float) -> tuple[str, float]:
+    try:
+        redis = get_redis(RedisRole.CACHE)
+        script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        async with asyncio.timeout(timeout):
+            allowed, retry_after_ms = await script(
+                keys=[key], args=[limit.capacity, limit.refill_per_second]
+            )
+        return "redis", 0.0 if allowed else retry_after_ms / 1000
+    except TimeoutError:
+        RATE_LIMIT_FALLBACKS.labels(reason="timeout").inc()
+    except RedisError:
+        logger.exception("Rate limit check failed")
+        RATE_LIMIT_FALLBACKS.labels(reason="error").inc()
+    return "local", _local_buckets.take(key, limit)
+
+
+class RateLimiter:
+    def __init__(self, route: str) -> None:
+        self._route = route
+
+    async def __call__(self, auth: Annotated[Auth, Depends(get_auth)]) -> None:
+        settings = get_settings()
+        limit = settings.rate_limits.get(self._route)
+        if not settings.rate_limit_enabled or limit is None:
+            return
+        backend, retry_after = await _take_token(
+            f"rate_limit:{self._route}:{auth.id}",
+            limit,
+            settings.rate_limit_redis_timeout,
+        )
+        if retry_after > 0:
+            RATE_LIMIT_REJECTIONS.labels(route=self._route, backend=backend).inc()
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
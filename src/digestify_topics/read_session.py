@@ -0,0 +1,58 @@
+import logging
+from typing import Annotated, AsyncIterator
+from uuid import UUID
+
+from fastapi import Depends
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics.auth import Auth, get_auth
+from digestify_topics.db import get_engine, get_read_engine
+from digestify_topics.settings import get_settings
+from digestify_topics.stream import RedisRole, get_redis
+
+logger = logging.getLogger(__name__)
+
+
+def _recent_write_key(user_id: UUID) -> str:
+    return f"recent_write:{user_id}"
+
+
+async def mark_recent_write(user_id: UUID) -> None:
+    # Only needed when reads can go to a replica that may lag behind.
+    if get_read_engine() is get_engine():
+        return
+    settings = get_settings()
+    try:
+        await get_redis(RedisRole.CACHE).set(
+            _recent_write_key(user_id), 1, ex=settings.read_your_writes_seconds
+        )
+    except RedisError:
+        logger.exception("Failed to mark recent write for user %s", user_id)
+
+
+async def _has_recent_write(user_id: UUID) -> bool:
+    try:
+        redis = get_redis(RedisRole.CACHE)
+        return bool(await redis.exists(_recent_write_key(user_id)))
+    except RedisError:
+        logger.exception("Failed to check recent write for user %s", user_id)
+        return True
+
+
+async def get_read_engine_for(user_id: UUID) -> AsyncEngine:
+    engine = get_read_engine()
+    # Users who have just written read from the primary so they see their
+    # own changes while the replica catches up.
+    if engine is not get_engine() and await _has_recent_write(user_id):
+        return get_engine()
+    return engine
+
+
+async def get_read_session(
+    auth: Annotated[Auth, Depends(get_auth)],
+) -> AsyncIterator[AsyncSession]:
+    engine = await get_read_engine_for(auth.id)
+    async with AsyncSession(engine) as session:
+        yield session
@@ -1,20 +1,68 @@
+import base64
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
 from typing import Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+import sqlalchemy
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Select, case, exists, func, inspect, literal, true, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio.engine import AsyncEngine
+from sqlmodel import col, insert, not_, select, update
 
-from digestify_topics.auth import Auth, get_auth
-from digestify_topics.db import AsyncSession, get_session
+from digestify_topics.auth import Auth, get_admin_auth, get_auth
+from digestify_topics.db import AsyncSession, get_read_engine, get_session
 from digestify_topics.messages import TopicCreated, TopicDeleted
 from digestify_topics.models import OutboxMessage, Topic, User
 from digestify_topics.queries import HTTPQueries, Queries
-from digestify_topics.schemas import TopicRespone, TopicsResponse, UserResponse
+from digestify_topics.rate_limit import RateLimiter
+from digestify_topics.read_session import (
+    get_read_engine_for,
+    get_read_session,
+    mark_recent_write,
+)
+from digestify_topics.schemas import (
+    TopicChangesResponse,
+    TopicRespone,
+    TopicsResponse,
+    UserResponse,
+)
+from digestify_topics.settings import get_settings
 
 router = APIRouter()
 
 
-@router.post("/topics", status_code=201)
+async def _start_topic_write(session: AsyncSession) -> datetime:
+    # /topics/changes only returns changes older than the settle window, so
+    # a topic must commit within the window of its updated_at. It is stamped
+    # with the database's clock_timestamp() just before it is written, rather
+    # than at the start of the transaction. The few statements and pauses
+    # until the commit, lock waits included, are each limited to a tenth of
+    # the window.
+    # SQLite, used by the tests, has neither, so the app's clock is used.
+    bind = session.bind
+    if bind is None or bind.dialect.name != "postgresql":
+        return datetime.now(timezone.utc)
+    timeout = str(max(1, int(get_settings().changes_settle_seconds * 100)))
+    row = (
+        await session.exec(
+            select(
+                func.clock_timestamp(),
+                func.set_config("statement_timeout", timeout, True),
+                func.set_config("idle_in_transaction_session_timeout", timeout, True),
+            )
+        )
+    ).one()
+    return row[0]
+
+
+@router.post(
+    "/topics",
+    status_code=201,
+    dependencies=[Depends(RateLimiter("create_topic"))],
+)
 async def create_topic(
     name: str,
     description: str,
@@ -25,23 +73,27 @@ async def create_topic(
     session: Annotated[AsyncSession, Depends(get_session)],
     queries: Annotated[Queries, Depends(HTTPQueries)],
 ) -> TopicRespone:
+    # The remote checks run before the user row is locked, so that the
+    # user's other writes do not queue behind them.
+    used_subscribed = await queries.check_user_subscription(auth.id)
+    is_safe = await queries.validate_topic_creation(name, description)
+
     user = (
         await session.exec(select(User).where(User.id == auth.id).with_for_update())
     ).one_or_none()
     if user is None or user.discarded:
         raise HTTPException(status_code=404, detail="User not found")
+    now = await _start_topic_write(session)
 
     user.created_topic_count += 1
     user.increment_version()
 
-    used_subscribed = await queries.check_user_subscription(user.id)
     if not used_subscribed and user.created_topic_count >= 5:
         raise HTTPException(
             status_code=403,
             detail="User is not subscribed and has already created 5 topics",
         )
 
-    is_safe = await queries.validate_topic_creation(name, description)
     if not is_safe:
         raise HTTPException(status_code=400, detail="Topic creation is not safe")
 
@@ -54,26 +106,91 @@ async def create_topic(
         user_id=user.id,
     )
     topic.increment_version()
+    # Stamped by the database, whose clock /topics/changes settles against.
+    topic.created_at = topic.updated_at = now
     session.add(topic)
 
     message = OutboxMessage.from_payload(
         TopicCreated(topic_id=topic.id, user_id=user.id),
-        entity="topic",
+        entity=f"topic:{topic.id}",
         version=topic.version,
     )
     session.add(message)
 
     await session.commit()
+    await mark_recent_write(auth.id)
 
     await session.refresh(topic)
     return TopicRespone.model_validate(topic.model_dump())
 
 
+def _encode_cursor(updated_at: datetime, topic_id: UUID) -> str:
+    return base64.urlsafe_b64encode(
+        f"{updated_at.isoformat()}|{topic_id}".encode()
+    ).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        updated_at, topic_id = base64.urlsafe_b64decode(cursor).decode().split("|")
+        return datetime.fromisoformat(updated_at), UUID(topic_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@router.get("/topics/changes")
+async def get_topic_changes(
+    auth: Annotated[Auth, Depends(get_auth)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
+    cursor: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 500,
+) -> TopicChangesResponse:
+    # A change is only returned once it is older than the settle window,
+    # counted back from the last commit this database has applied. A write
+    # whose transaction is still open then commits before the cursor can
+    # move past its updated_at, so it is not skipped. On a replica, the last
+    # commit applied is its replay position rather than now(), until it has
+    # replayed its first transaction since starting. Topics' updated_at is
+    # stamped by the primary's clock to compare with either.
+    applied_at = case(
+        (
+            func.pg_is_in_recovery(),
+            func.coalesce(func.pg_last_xact_replay_timestamp(), func.now()),
+        ),
+        else_=func.now(),
+    )
+    settled_at = applied_at - timedelta(seconds=get_settings().changes_settle_seconds)
+    statement = (
+        select(Topic)
+        .where(col(Topic.user_id) == auth.id, col(Topic.updated_at) <= settled_at)
+        .order_by(col(Topic.updated_at), col(Topic.id))
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        statement = statement.where(
+            tuple_(col(Topic.updated_at), col(Topic.id)) > _decode_cursor(cursor)
+        )
+    topics = (await session.exec(statement)).all()
+    page = topics[:limit]
+    if page:
+        cursor = _encode_cursor(page[-1].updated_at, page[-1].id)
+    return TopicChangesResponse(
+        topics=[
+            TopicRespone.model_validate(topic.model_dump())
+            for topic in page
+            if not topic.discarded
+        ],
+        deleted_topic_ids=[topic.id for topic in page if topic.discarded],
+        cursor=cursor,
+        has_more=len(topics) > limit,
+    )
+
+
 @router.get("/topics/{topic_id}")
 async def get_topic_by_id(
     topic_id: UUID,
     auth: Annotated[Auth, Depends(get_auth)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> TopicRespone:
     topic = (
         await session.exec(select(Topic).where(Topic.id == topic_id))
@@ -88,62 +205,159 @@ async def get_topic_by_id(
     return TopicRespone.model_validate(topic.model_dump())
 
 
-@router.delete("/topics/{topic_id}", status_code=204)
+@router.delete(
+    "/topics/{topic_id}",
+    status_code=204,
+    dependencies=[Depends(RateLimiter("delete_topic"))],
+)
 async def delete_topic(
     topic_id: UUID,
     auth: Annotated[Auth, Depends(get_auth)],
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> None:
-    topic = (
-        await session.exec(select(Topic).where(Topic.id == topic_id).with_for_update())
-    ).one_or_none()
-    if topic is None or topic.discarded or topic.user_id != auth.id:
-        raise HTTPException(status_code=404, detail="Topic not found")
-
-    user = (
-        await session.exec(
-            select(User).where(User.id == topic.user_id).with_for_update()
+    # One statement: discard the topic, decrement its owner's counter and
+    # insert the outbox message. The topic is updated first so that it is
+    # locked before the user, as it always was, and so that concurrent
+    # deletes of the same topic decrement the counter only once.
+    now = await _start_topic_write(session)
+    discarded_topic = (
+        update(Topic)
+        .where(
+            col(Topic.id) == topic_id,
+            col(Topic.user_id) == auth.id,
+            not_(Topic.discarded),
         )
-    ).one_or_none()
-    if user is None or user.discarded:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user.created_topic_count -= 1
-    user.increment_version()
-
-    topic.discarded = True
-    topic.increment_version()
-
+        .values(discarded=True, version=col(Topic.version) + 1, updated_at=now)
+        .returning(col(Topic.version))
+        .cte("discarded_topic")
+    )
+    updated_user = (
+        update(User)
+        .where(
+            col(User.id) == auth.id,
+            not_(User.discarded),
+            exists(discarded_topic.select()),
+        )
+        .values(
+            created_topic_count=col(User.created_topic_count) - 1,
+            version=col(User.version) + 1,
+            updated_at=now,
+        )
+        .returning(col(User.id))
+        .cte("updated_user")
+    )
     message = OutboxMessage.from_payload(
-        TopicDeleted(topic_id=topic.id, user_id=user.id),
-        entity="topic",
-        version=topic.version,
+        TopicDeleted(topic_id=topic_id, user_id=auth.id),
+        entity=f"topic:{topic_id}",
     )
-    session.add(message)
+    fields = ["id", "type", "entity", "payload", "created_at", "request_id"]
+    outbox_columns = inspect(OutboxMessage).columns
+    outbox_message = (
+        insert(OutboxMessage)
+        .from_select(
+            ["version", *fields],
+            select(discarded_topic.c.version)
+            .add_columns(
+                *(
+                    literal(getattr(message, field), outbox_columns[field].type)
+                    for field in fields
+                )
+            )
+            .select_from(discarded_topic.join(updated_user, true())),
+        )
+        .cte("outbox_message")
+    )
+    statement = (
+        select(discarded_topic.c.version, updated_user.c.id)
+        .select_from(discarded_topic.outerjoin(updated_user, true()))
+        .add_cte(outbox_message)
+    )
+    result = (await session.exec(statement)).one_or_none()
+    if result is None:
+        raise HTTPException(status_code=404, detail="Topic not found")
+    if result[1] is None:
+        # The topic update is rolled back with the session.
+        raise HTTPException(status_code=404, detail="User not found")
 
     await session.commit()
+    await mark_recent_write(auth.id)
 
 
 @router.get("/my_topics")
 async def get_my_topics(
     auth: Annotated[Auth, Depends(get_auth)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> TopicsResponse:
     user = (await session.exec(select(User).where(User.id == auth.id))).one_or_none()
     if user is None or user.discarded:
         raise HTTPException(status_code=404, detail="User not found")
-    topics = (await session.exec(select(Topic).where(Topic.user_id == auth.id))).all()
-    topics = list(filter(lambda t: not t.discarded, topics))
+    topics = (
+        await session.exec(
+            select(Topic).where(Topic.user_id == auth.id, not_(Topic.discarded))
+        )
+    ).all()
     topic_responses = [
         TopicRespone.model_validate(topic.model_dump()) for topic in topics
     ]
     return TopicsResponse(topics=topic_responses)
 
 
+def _export_statement() -> Select:
+    columns = [getattr(Topic, name) for name in TopicRespone.model_fields]
+    return sqlalchemy.select(*columns).where(not_(Topic.discarded))
+
+
+async def _export_topics(
+    engine: AsyncEngine, statement: Select
+) -> AsyncIterator[bytes]:
+    # Rows come from a server-side cursor one batch at a time and each batch
+    # is written out before the next is fetched, so memory stays flat however
+    # many rows there are, and a slow client holds back the cursor instead of
+    # rows piling up in memory. The generator owns its connection because
+    # request dependencies are closed before the body is streamed.
+    statement = statement.execution_options(yield_per=get_settings().export_batch_size)
+    async with engine.connect() as connection:
+        result = await connection.stream(statement)
+        async for rows in result.partitions():
+            yield b"".join(
+                TopicRespone.model_validate(row._asdict()).model_dump_json().encode()
+                + b"\n"
+                for row in rows
+            )
+
+
+@router.get("/my_topics/export")
+async def export_my_topics(
+    auth: Annotated[Auth, Depends(get_auth)],
+) -> StreamingResponse:
+    engine = await get_read_engine_for(auth.id)
+    # Checked before streaming starts, while an error status can still be sent.
+    async with AsyncSession(engine) as session:
+        user = await session.get(User, auth.id)
+    if user is None or user.discarded:
+        raise HTTPException(status_code=404, detail="User not found")
+    statement = _export_statement().where(col(Topic.user_id) == auth.id)
+    return StreamingResponse(
+        _export_topics(engine, statement), media_type="application/x-ndjson"
+    )
+
+
+@router.get("/admin/topics/export")
+async def export_topics(
+    auth: Annotated[Auth, Depends(get_admin_auth)],
+) -> StreamingResponse:
+    # Read from the replica when there is one: a long export on the primary
+    # would hold back vacuum for its whole duration.
+    return StreamingResponse(
+        _export_topics(get_read_engine(), _export_statement()),
+        media_type="application/x-ndjson",
+    )
+
+
 @router.get("/me")
 async def get_my_user(
     auth: Annotated[Auth, Depends(get_auth)],
-    session: Annotated[AsyncSession, Depends(get_session)],
+    session: Annotated[AsyncSession, Depends(get_read_session)],
 ) -> UserResponse:
     user = (await session.exec(select(User).where(User.id == auth.id))).one_or_none()
     if user is None or user.discarded:
@@ -156,20 +370,32 @@ async def create_my_user(
     auth: Annotated[Auth, Depends(get_auth)],
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> UserResponse:
-    user = (
-        await session.exec(select(User).where(User.id == auth.id).with_for_update())
-    ).one_or_none()
-    if user is not None and not user.discarded:
-        raise HTTPException(status_code=400, detail="User already exists")
-
-    if user is None:
-        user = User(id=auth.id)
-        session.add(user)
-    else:
-        user.discarded = False
+    # Creates the user, or restores a discarded one; an active user is left
+    # untouched and nothing is returned.
+    user = User(id=auth.id)
     user.increment_version()
+    now = func.now()
+    statement = (
+        postgresql.insert(User)
+        .values({**user.model_dump(), "created_at": now, "updated_at": now})
+        .on_conflict_do_update(
+            index_elements=[col(User.id)],
+            set_={
+                "discarded": False,
+                "version": col(User.version) + 1,
+                "updated_at": now,
+            },
+            where=col(User.discarded).is_(True),
+        )
+        .returning(User)
+    )
+    created_user = (await session.execute(statement)).scalar_one_or_none()
+    if created_user is None:
+        raise HTTPException(status_code=400, detail="User already exists")
+    # Built before the commit, which expires the returned user.
+    response = UserResponse.model_validate(created_user.model_dump())
 
     await session.commit()
-    await session.refresh(user)
+    await mark_recent_write(auth.id)
 
-    return UserResponse.model_validate(user.model_dump())
+    return response
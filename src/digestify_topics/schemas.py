@@ -23,5 +23,12 @@ class TopicsResponse(BaseModel):
     topics: list[TopicRespone]
 
 
+class TopicChangesResponse(BaseModel):
+    topics: list[TopicRespone]
+    deleted_topic_ids: list[UUID]
+    cursor: str | None
+    has_more: bool
+
+
 class UserResponse(Entity):
     created_topic_count: int
@@ -1,26 +1,87 @@
-from pydantic import Field
+from uuid import UUID
+
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+class RateLimit(BaseModel):
+    capacity: int
+    refill_per_second: float
+
+
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     debug: bool = Field(default=...)
     jwks_url: str = Field(default=...)
+    admin_user_ids: list[UUID] = Field(default=[])
     postgres_host: str = Field(default=...)
     postgres_port: int = Field(default=...)
     postgres_user: str = Field(default=...)
     postgres_password: str = Field(default=...)
     postgres_db: str = Field(default=...)
+    postgres_pool_size: int = Field(default=10)
+    postgres_max_overflow: int = Field(default=10)
+    postgres_pool_timeout: float = Field(default=30)
+    postgres_pool_recycle: int = Field(default=1800)
+    postgres_pool_pre_ping: bool = Field(default=True)
+    postgres_pool_warmup: bool = Field(default=True)
+    postgres_statement_cache_size: int = Field(default=256)
+    postgres_jit: bool = Field(default=False)
+    postgres_read_host: str | None = Field(default=None)
+    postgres_read_port: int | None = Field(default=None)
+    read_your_writes_seconds: int = Field(default=5)
+    export_batch_size: int = Field(default=1000)
+    changes_settle_seconds: float = Field(default=5)
     redis_host: str = Field(default=...)
     redis_port: int = Field(default=...)
     redis_password: str = Field(default=...)
+    redis_consumer_max_connections: int = Field(default=20)
+    redis_command_max_connections: int = Field(default=10)
+    redis_publisher_max_connections: int = Field(default=10)
+    redis_cache_max_connections: int = Field(default=20)
+    redis_pool_timeout: float = Field(default=5)
+    redis_socket_timeout: float = Field(default=5)
+    redis_health_check_interval: int = Field(default=30)
+    redis_retries: int = Field(default=3)
+    stream_shard_count: int = Field(default=1)
+    stream_shard_assignment: list[int] | None = Field(default=None)
+    stream_previous_shard_count: int | None = Field(default=None)
+    backfill_concurrency: int = Field(default=2)
+    handled_message_retention_seconds: int = Field(default=604800)
     openai_api_key: str = Field(default=...)
+    moderation_blocked_terms: list[str] = Field(default=[])
+    moderation_review_terms: list[str] = Field(default=[])
+    moderation_remote_enabled: bool = Field(default=False)
+    moderation_timeout: float = Field(default=0.5)
+    moderation_fail_open: bool = Field(default=True)
+    moderation_cache_seconds: int = Field(default=86400)
+    rate_limit_enabled: bool = Field(default=True)
+    rate_limit_redis_timeout: float = Field(default=0.05)
+    rate_limits: dict[str, RateLimit] = Field(
+        default={
+            "create_topic": RateLimit(capacity=10, refill_per_second=0.2),
+            "delete_topic": RateLimit(capacity=20, refill_per_second=0.5),
+        }
+    )
+    api_background_enabled: bool = Field(default=True)
+    outbox_batch_size: int = Field(default=10)
+    outbox_partition_size: int = Field(default=0)
+    shutdown_timeout: float = Field(default=10)
+    profiling_enabled: bool = Field(default=False)
+    profiling_sample_rate: float = Field(default=0)
+    profiling_interval: float = Field(default=0.005)
+    profiling_slow_seconds: float = Field(default=0.5)
+    profiling_buffer_size: int = Field(default=100)
 
 
-_settings = Settings()
+_settings: Settings | None = None
 
 
 def get_settings() -> Settings:
+    # Loaded on first use so that importing modules does not require a
+    # complete environment.
     global _settings
+    if _settings is None:
+        _settings = Settings()
     return _settings
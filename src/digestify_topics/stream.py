@@ -1,31 +1,138 @@
-from redis.asyncio import Redis
+import binascii
+import time
+from enum import StrEnum
+from typing import Any
 
-from digestify_topics.settings import get_settings
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.connection import Connection
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
 
-_redis: Redis | None = None
+from digestify_topics.metrics import REDIS_POOL_WAIT
+from digestify_topics.settings import Settings, get_settings
 
+STREAM = "digestify_topics"
+# Replays from backfills go to their own stream, which workers consume with
+# separate, lower concurrency so that they cannot delay live events.
+BACKFILL_STREAM = f"{STREAM}:backfill"
 
-def initialize_redis() -> None:
-    global _redis
-    if _redis is not None:
-        raise ValueError("Redis has already been initialized.")
-    settings = get_settings()
-    _redis = Redis(
+
+def stream_shards(stream: str, shard_count: int) -> list[str]:
+    # Each shard name carries its index as a hash tag, which pins it to a
+    # single Redis Cluster hash slot. One shard keeps the plain stream name.
+    if shard_count == 1:
+        return [stream]
+    return [f"{stream}:{{{index}}}" for index in range(shard_count)]
+
+
+def shard_index(key: str, shard_count: int) -> int:
+    # CRC16, the same hash Redis Cluster uses for key slots.
+    return binascii.crc_hqx(key.encode(), 0) % shard_count
+
+
+def consumer_streams(
+    settings: Settings, process_index: int = 0, process_count: int = 1
+) -> list[str]:
+    shards = stream_shards(STREAM, settings.stream_shard_count)
+    assigned = [
+        shard
+        for index, shard in enumerate(shards)
+        if settings.stream_shard_assignment is None
+        or index in settings.stream_shard_assignment
+    ]
+    # Each shard is read by one process, so processes beyond the number of
+    # shards would have nothing to read.
+    if process_count > len(assigned):
+        raise ValueError(
+            f"{process_count} processes cannot share {len(assigned)} stream "
+            "shards; raise STREAM_SHARD_COUNT or run fewer processes."
+        )
+    streams = assigned[process_index::process_count]
+    # While resharding, every consumer also drains the previous layout until
+    # publishers have switched over and its streams are empty.
+    if settings.stream_previous_shard_count is not None:
+        for shard in stream_shards(STREAM, settings.stream_previous_shard_count):
+            if shard not in shards:
+                streams.append(shard)
+    return streams
+
+
+class RedisRole(StrEnum):
+    # Blocking XREADGROUP loops hold a connection for the whole block time,
+    # so they get their own pool and cannot starve publishes or cache reads.
+    # The consumers' other commands, such as acks, use the command pool so
+    # that they do not wait behind the blocking reads either.
+    CONSUMER = "consumer"
+    COMMAND = "command"
+    PUBLISHER = "publisher"
+    CACHE = "cache"
+
+
+class TimedConnectionPool(BlockingConnectionPool):
+    def __init__(self, role: RedisRole, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self._wait = REDIS_POOL_WAIT.labels(role=role)
+
+    async def get_connection(self, *args: Any, **kwargs: Any) -> Connection:
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            self._wait.observe(time.perf_counter() - started)
+
+
+_redis: dict[RedisRole, Redis] = {}
+
+
+def _max_connections(settings: Settings, role: RedisRole) -> int:
+    match role:
+        case RedisRole.CONSUMER:
+            return settings.redis_consumer_max_connections
+        case RedisRole.COMMAND:
+            return settings.redis_command_max_connections
+        case RedisRole.PUBLISHER:
+            return settings.redis_publisher_max_connections
+        case RedisRole.CACHE:
+            return settings.redis_cache_max_connections
+
+
+def create_redis(settings: Settings, role: RedisRole) -> Redis:
+    pool = TimedConnectionPool(
+        role=role,
         host=settings.redis_host,
         port=settings.redis_port,
         password=settings.redis_password,
+        max_connections=_max_connections(settings, role),
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+        retry_on_timeout=True,
+        retry=Retry(ExponentialBackoff(), settings.redis_retries),
     )
+    return Redis(connection_pool=pool)
 
 
-def get_redis() -> Redis:
+def initialize_redis() -> None:
     global _redis
-    if _redis is None:
+    if _redis:
+        raise ValueError("Redis has already been initialized.")
+    settings = get_settings()
+    _redis = {role: create_redis(settings, role) for role in RedisRole}
+
+
+def get_redis(role: RedisRole) -> Redis:
+    global _redis
+    if not _redis:
         raise ValueError("Redis has not been initialized.")
-    return _redis
+    return _redis[role]
 
 
 async def dispose_redis() -> None:
     global _redis
-    redis = get_redis()
-    await redis.close()
-    _redis = None
+    if not _redis:
+        raise ValueError("Redis has not been initialized.")
+    for redis in _redis.values():
+        await redis.close()
+        # Pools passed in explicitly are not closed along with the client.
+        await redis.connection_pool.disconnect()
+    _redis = {}
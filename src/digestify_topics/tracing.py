@@ -0,0 +1,105 @@
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import override
+
+from pydantic import BaseModel
+
+from digestify_topics.metrics import EVENT_STAGE_DURATION
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+
+def get_request_id() -> str | None:
+    return _request_id.get()
+
+
+def set_request_id(request_id: str | None) -> None:
+    _request_id.set(request_id)
+
+
+class TraceContext(BaseModel):
+    request_id: str | None = None
+    created_at: datetime | None = None
+    published_at: datetime | None = None
+    stream_id: str | None = None
+
+
+class Span(BaseModel):
+    trace_id: str
+    name: str
+    start: datetime
+    end: datetime
+    attributes: dict[str, str] = {}
+
+    @property
+    def duration(self) -> float:
+        return (self.end - self.start).total_seconds()
+
+
+class SpanExporter(ABC):
+    @abstractmethod
+    def export(self, span: Span) -> None: ...
+
+
+class MetricsSpanExporter(SpanExporter):
+    @override
+    def export(self, span: Span) -> None:
+        EVENT_STAGE_DURATION.labels(stage=span.name).observe(span.duration)
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    @override
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+_exporter: SpanExporter = MetricsSpanExporter()
+
+
+def set_span_exporter(exporter: SpanExporter) -> None:
+    global _exporter
+    _exporter = exporter
+
+
+def get_span_exporter() -> SpanExporter:
+    global _exporter
+    return _exporter
+
+
+def record_span(
+    trace_id: str,
+    name: str,
+    start: datetime,
+    end: datetime | None = None,
+    attributes: dict[str, str | None] | None = None,
+) -> None:
+    span = Span(
+        trace_id=trace_id,
+        name=name,
+        start=start,
+        end=end or datetime.now(timezone.utc),
+        attributes={k: v for k, v in (attributes or {}).items() if v is not None},
+    )
+    get_span_exporter().export(span)
+
+
+@contextmanager
+def span(
+    trace_id: str,
+    name: str,
+    attributes: dict[str, str | None] | None = None,
+) -> Iterator[None]:
+    start = datetime.now(timezone.utc)
+    try:
+        yield
+    finally:
+        record_span(trace_id, name, start, attributes=attributes)
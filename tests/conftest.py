@@ -0,0 +1,84 @@
+import asyncio
+import os
+import subprocess
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from redis.asyncio import Redis
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+
+from digestify_topics import models  # noqa: F401
+
+ROOT = Path(__file__).parent.parent
+
+
+@pytest.fixture
+async def engine() -> AsyncIterator[AsyncEngine]:
+    # One in-memory SQLite database shared by every session of the test.
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(SQLModel.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+async def _reset_schema(url: str) -> None:
+    engine = create_async_engine(url)
+    async with engine.begin() as connection:
+        await connection.execute(text("DROP SCHEMA public CASCADE"))
+        await connection.execute(text("CREATE SCHEMA public"))
+    await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def postgres_url() -> str:
+    # Tests marked postgres run against a database they may wipe, e.g.
+    # TEST_DATABASE_URL=postgresql+asyncpg://postgres@localhost/test, which
+    # is migrated from scratch once per run. They are skipped without it.
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    asyncio.run(_reset_schema(url))
+    parsed = make_url(url)
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "-c", str(ROOT / "alembic.ini")]
+        + ["upgrade", "head"],
+        env={
+            **os.environ,
+            "POSTGRES_HOST": parsed.host or "localhost",
+            "POSTGRES_PORT": str(parsed.port or 5432),
+            "POSTGRES_USER": parsed.username or "",
+            "POSTGRES_PASSWORD": parsed.password or "",
+            "POSTGRES_DB": parsed.database or "",
+        },
+        cwd=ROOT,
+        check=True,
+    )
+    return url
+
+
+@pytest.fixture
+async def postgres_engine(postgres_url: str) -> AsyncIterator[AsyncEngine]:
+    engine = create_async_engine(postgres_url)
+    yield engine
+    async with engine.begin() as connection:
+        await connection.execute(
+            text(
+                "TRUNCATE topics, users, outbox_messages, handled_messages"
+                " RESTART IDENTITY"
+            )
+        )
+    await engine.dispose()
+
+
+@pytest.fixture
+async def redis() -> AsyncIterator[Redis]:
+    redis: Redis = FakeAsyncRedis()
+    yield redis
+    await redis.close()
@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from digestify_topics import cli
+from digestify_topics.app import assign_request_id
+from digestify_topics.tracing import get_request_id
+
+SCRAPE = """
+import asyncio
+
+from httpx import ASGITransport, AsyncClient
+
+from digestify_topics.app import metrics_app
+
+
+async def scrape():
+    transport = ASGITransport(app=metrics_app())
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        print((await client.get("/")).text)
+
+
+asyncio.run(scrape())
+"""
+
+
+def test_metrics_are_collected_across_processes(tmp_path: Path) -> None:
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    for _ in range(2):
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "from digestify_topics.metrics import HANDLER_ERRORS;"
+                "HANDLER_ERRORS.labels(handler='index_topic').inc()",
+            ],
+            env=env,
+            check=True,
+        )
+    scrape = subprocess.run(
+        [sys.executable, "-c", SCRAPE],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    assert 'handler_errors_total{handler="index_topic"} 2.0' in scrape.stdout
+
+
+@pytest.mark.parametrize(("processes", "shared"), [(1, False), (2, True)])
+def test_api_processes_share_a_metrics_directory(
+    processes: int, shared: bool, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import uvicorn
+
+    # Restored to unset once the test is over.
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", "")
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR")
+    monkeypatch.setattr(cli.tempfile, "mkdtemp", lambda prefix: str(tmp_path))
+    runs: list[dict[str, Any]] = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **kwargs: runs.append(kwargs))
+
+    cli.main(["api", "--processes", str(processes)])
+
+    assert runs[0]["workers"] == processes
+    assert (os.environ.get("PROMETHEUS_MULTIPROC_DIR") == str(tmp_path)) == shared
+
+
+@pytest.mark.parametrize(
+    ("header", "kept"),
+    [
+        ("7f3c2a9e-1b4d-4c8e-9f0a-2d6b8e1c5a7f", True),
+        ("frontend:req.42_a", True),
+        ("x" * 64, True),
+        ("x" * 65, False),
+        ("", False),
+        ("id with spaces", False),
+        ("id;name=value", False),
+        ("<script>", False),
+    ],
+)
+async def test_request_id(header: str, kept: bool) -> None:
+    app = FastAPI()
+    app.middleware("http")(assign_request_id)
+
+    @app.get("/")
+    async def index() -> str | None:
+        return get_request_id()
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get("/", headers={"X-Request-ID": header})
+
+    request_id = response.json()
+    assert response.headers["X-Request-ID"] == request_id
+    if kept:
+        assert request_id == header
+    else:
+        # A fresh one instead.
+        assert len(request_id) == 32 and request_id != header
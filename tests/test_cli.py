@@ -0,0 +1,33 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from digestify_topics.cli import _run_until_shutdown
+
+
+async def test_run_until_shutdown_raises_when_running_fails() -> None:
+    async def fail() -> None:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("Consumer died")
+
+    with pytest.raises(RuntimeError, match="Consumer died"):
+        async with asyncio.timeout(5):
+            await _run_until_shutdown(fail())
+
+
+async def test_run_until_shutdown_returns_on_sigterm() -> None:
+    running = asyncio.Event()
+
+    async def run() -> None:
+        running.set()
+        await asyncio.Event().wait()
+
+    task = asyncio.create_task(_run_until_shutdown(run()))
+    await running.wait()
+    os.kill(os.getpid(), signal.SIGTERM)
+    async with asyncio.timeout(5):
+        await task
+    asyncio.get_running_loop().remove_signal_handler(signal.SIGTERM)
+    asyncio.get_running_loop().remove_signal_handler(signal.SIGINT)
@@ -0,0 +1,126 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from digestify_topics.settings import Settings
+
+ROOT = Path(__file__).parent.parent
+# Multiplies every time budget, e.g. on slow CI machines.
+BUDGET_SCALE = float(os.environ.get("IMPORT_TIME_BUDGET_SCALE", "1"))
+
+
+class Budget(BaseModel):
+    milliseconds: float
+    forbidden: list[str]
+
+
+# What each kind of process imports at startup, and the heavy modules it must
+# not pull in. Times are generous so that only real regressions fail.
+BUDGETS = {
+    "digestify_topics": Budget(
+        milliseconds=300,
+        forbidden=["fastapi", "sqlalchemy", "redis", "openai", "aiohttp", "httpx"],
+    ),
+    "digestify_topics.models": Budget(
+        milliseconds=1500,
+        forbidden=["fastapi", "redis", "openai", "aiohttp", "httpx"],
+    ),
+    # Imported by migrations, the publisher and the workers.
+    "digestify_topics.db": Budget(
+        milliseconds=1500,
+        forbidden=["fastapi", "starlette", "jwt", "redis", "openai", "aiohttp"],
+    ),
+    "digestify_topics.outbox_publisher": Budget(
+        milliseconds=1800,
+        forbidden=["fastapi", "openai", "aiohttp", "httpx"],
+    ),
+    "digestify_topics.handlers": Budget(
+        milliseconds=1800,
+        forbidden=["fastapi", "openai", "aiohttp", "httpx"],
+    ),
+    "digestify_topics.app": Budget(
+        milliseconds=2500,
+        forbidden=["openai", "aiohttp", "httpx"],
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def environment() -> dict[str, str]:
+    # Imports must succeed without any settings in the environment.
+    setting_names = {name.upper() for name in Settings.model_fields}
+    return {
+        key: value
+        for key, value in os.environ.items()
+        if key.upper() not in setting_names
+    }
+
+
+def import_times(args: list[str], env: dict[str, str], cwd: Path) -> dict[str, float]:
+    # Cumulative import time in milliseconds of every module imported.
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=cwd,
+    )
+    assert result.returncode == 0, result.stderr
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.removeprefix("import time:").split("|")
+        if total.strip().isdigit():
+            times[name.strip()] = int(total) / 1000
+    return times
+
+
+def forbidden_imports(imported: dict[str, float], forbidden: list[str]) -> list[str]:
+    return sorted(
+        name
+        for name in forbidden
+        if any(m == name or m.startswith(f"{name}.") for m in imported)
+    )
+
+
+@pytest.mark.parametrize("module", BUDGETS)
+def test_import_time(module: str, environment: dict[str, str], tmp_path: Path) -> None:
+    budget = BUDGETS[module]
+    # Run outside the repository so that a local .env is not picked up.
+    runs = [
+        import_times(["-c", f"import {module}"], environment, tmp_path)
+        for _ in range(3)
+    ]
+    assert forbidden_imports(runs[0], budget.forbidden) == []
+    assert min(run[module] for run in runs) <= budget.milliseconds * BUDGET_SCALE
+
+
+def test_migrations_import_no_app_dependencies(
+    environment: dict[str, str], tmp_path: Path
+) -> None:
+    # Offline mode renders the SQL without connecting, but loads the same
+    # modules as a real migration.
+    imported = import_times(
+        ["-m", "alembic", "-c", str(ROOT / "alembic.ini"), "upgrade", "head", "--sql"],
+        {
+            **environment,
+            "POSTGRES_HOST": "localhost",
+            "POSTGRES_PORT": "5432",
+            "POSTGRES_USER": "user",
+            "POSTGRES_PASSWORD": "password",
+            "POSTGRES_DB": "db",
+        },
+        tmp_path,
+    )
+    assert "digestify_topics.db" in imported
+    assert (
+        forbidden_imports(
+            imported, ["fastapi", "starlette", "jwt", "redis", "openai", "aiohttp"]
+        )
+        == []
+    )
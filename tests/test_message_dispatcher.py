@@ -0,0 +1,473 @@
+import asyncio
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from uuid import UUID
+
+import pytest
+from fakeredis import FakeAsyncRedis, FakeServer
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics.message_dispatcher import MessageDispatcher
+from digestify_topics.messages import Message, TopicCreated, TopicDeleted
+from digestify_topics.models import HandledMessage
+
+STREAM = "test"
+
+
+def topic_event(
+    event: type[TopicCreated | TopicDeleted] = TopicCreated,
+    topic_id: UUID | None = None,
+    version: int | None = None,
+    user_id: UUID | None = None,
+) -> Message:
+    topic_id = topic_id or uuid.uuid4()
+    payload = event(topic_id=topic_id, user_id=user_id or uuid.uuid4())
+    return Message(
+        id=str(uuid.uuid4()),
+        type=event.__name__,
+        payload=payload.model_dump(mode="json"),
+        entity=None if version is None else f"topic:{topic_id}",
+        version=version,
+    )
+
+
+async def publish(redis: Redis, *messages: Message) -> None:
+    for message in messages:
+        await redis.xadd(STREAM, {"data": message.model_dump_json()})
+
+
+async def pending(redis: Redis, group: str = "index_topic") -> int:
+    return (await redis.xpending(STREAM, group))["pending"]
+
+
+async def consumed(redis: Redis, group: str = "index_topic") -> bool:
+    # Every message on the stream has been read and acked.
+    info = next(
+        g for g in await redis.xinfo_groups(STREAM) if g["name"] == group.encode()
+    )
+    last = await redis.xrevrange(STREAM, count=1)
+    return (
+        bool(last) and info["last-delivered-id"] == last[0][0] and not info["pending"]
+    )
+
+
+async def wait_until(condition: Callable[[], Awaitable[bool]]) -> None:
+    async with asyncio.timeout(5):
+        while not await condition():
+            await asyncio.sleep(0.01)
+
+
+def create_dispatcher(
+    engine: AsyncEngine, redis: Redis, lease_seconds: float = 10
+) -> MessageDispatcher:
+    dispatcher = MessageDispatcher(stream=STREAM, lease_seconds=lease_seconds)
+    dispatcher.set_redis(redis)
+    dispatcher.set_engine(engine)
+    return dispatcher
+
+
+@pytest.fixture
+async def dispatcher(engine: AsyncEngine, redis: Redis) -> MessageDispatcher:
+    await redis.xgroup_create(STREAM, "index_topic", id="0", mkstream=True)
+    return create_dispatcher(engine, redis)
+
+
+async def test_failed_ack_does_not_run_the_handler_again(
+    dispatcher: MessageDispatcher, redis: Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    handled: list[int | None] = []
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        handled.append(len(handled) + 1)
+
+    xack = redis.xack
+    failures = [RedisError("Connection lost")]
+
+    async def flaky_xack(*args: Any) -> Any:
+        if failures:
+            raise failures.pop()
+        return await xack(*args)
+
+    monkeypatch.setattr(redis, "xack", flaky_xack)
+    # Both versions of one entity run in the same lane, so the second is only
+    # handled if the failed ack did not take the consumer down.
+    topic_id = uuid.uuid4()
+    await publish(
+        redis,
+        topic_event(topic_id=topic_id, version=1),
+        topic_event(topic_id=topic_id, version=2),
+    )
+
+    dispatcher.start()
+    try:
+
+        async def second_acked() -> bool:
+            return len(handled) == 2 and await pending(redis) == 1
+
+        await wait_until(second_acked)
+    finally:
+        await dispatcher.stop()
+
+    assert handled == [1, 2]
+
+
+async def test_redelivered_handled_message_is_acked(
+    dispatcher: MessageDispatcher, engine: AsyncEngine, redis: Redis
+) -> None:
+    calls = 0
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        nonlocal calls
+        calls += 1
+
+    # Committed by an earlier delivery whose ack never reached Redis.
+    message = topic_event()
+    async with AsyncSession(engine) as session:
+        session.add(HandledMessage(message_id=message.id, handler_name="index_topic"))
+        await session.commit()
+    await publish(redis, message)
+
+    dispatcher.start()
+    try:
+
+        async def acked() -> bool:
+            return calls > 0 and await pending(redis) == 0
+
+        await wait_until(acked)
+    finally:
+        await dispatcher.stop()
+
+    assert calls == 1
+
+
+async def test_lanes_keep_entity_order_and_run_entities_concurrently(
+    dispatcher: MessageDispatcher, redis: Redis
+) -> None:
+    handled: list[UUID] = []
+    fast_handled = asyncio.Event()
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        if payload.topic_id == slow_topic_id:
+            # Only finishes once the other entity's message ran meanwhile.
+            await fast_handled.wait()
+        handled.append(payload.user_id)
+        if payload.topic_id == fast_topic_id:
+            fast_handled.set()
+
+    slow_topic_id, fast_topic_id = uuid.uuid4(), uuid.uuid4()
+    slow = [
+        topic_event(topic_id=slow_topic_id, version=version, user_id=uuid.uuid4())
+        for version in (1, 2, 3)
+    ]
+    fast = topic_event(topic_id=fast_topic_id, version=1, user_id=uuid.uuid4())
+    await publish(redis, *slow, fast)
+
+    dispatcher.start()
+    try:
+
+        async def all_handled() -> bool:
+            return len(handled) == 4
+
+        await wait_until(all_handled)
+    finally:
+        await dispatcher.stop()
+
+    assert handled == [UUID(message.payload["user_id"]) for message in [fast, *slow]]
+
+
+async def test_handled_version_is_stale_in_another_process(
+    dispatcher: MessageDispatcher, engine: AsyncEngine, redis: Redis
+) -> None:
+    handled: list[int | None] = []
+
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        handled.append(versions[payload.user_id])
+
+    topic_id = uuid.uuid4()
+    messages = [
+        topic_event(topic_id=topic_id, version=version, user_id=uuid.uuid4())
+        for version in (2, 1)
+    ]
+    versions = {UUID(m.payload["user_id"]): m.version for m in messages}
+
+    dispatcher.register()(index_topic)
+    await publish(redis, messages[0])
+    dispatcher.start()
+    try:
+        await wait_until(lambda: consumed(redis))
+    finally:
+        await dispatcher.stop()
+
+    # A process that has not seen version 2 still skips the older version,
+    # as during resharding.
+    other = create_dispatcher(engine, redis)
+    other.register()(index_topic)
+    await publish(redis, messages[1])
+    other.start()
+    try:
+        await wait_until(lambda: consumed(redis))
+    finally:
+        await other.stop()
+
+    assert handled == [2]
+
+
+async def test_versions_are_looked_up_once_per_batch_and_skips_not_stored(
+    dispatcher: MessageDispatcher, engine: AsyncEngine, redis: Redis
+) -> None:
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        pass
+
+    lookups = 0
+
+    def count_lookups(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        nonlocal lookups
+        if "max(handled_messages.version)" in statement:
+            lookups += 1
+
+    # Read in one batch: ten new entities, and deletions the handler skips.
+    created = [topic_event(version=1) for _ in range(10)]
+    deleted = [topic_event(TopicDeleted, version=2) for _ in range(5)]
+    await publish(redis, *created, *deleted)
+    event.listen(engine.sync_engine, "before_cursor_execute", count_lookups)
+    dispatcher.start()
+    try:
+        await wait_until(lambda: consumed(redis))
+    finally:
+        await dispatcher.stop()
+        event.remove(engine.sync_engine, "before_cursor_execute", count_lookups)
+
+    assert lookups == 1
+    async with AsyncSession(engine) as session:
+        rows = (await session.exec(select(HandledMessage))).all()
+    assert sorted(row.message_id for row in rows) == sorted(m.id for m in created)
+
+
+async def test_old_handled_messages_are_pruned(
+    dispatcher: MessageDispatcher, engine: AsyncEngine
+) -> None:
+    now = datetime.now(timezone.utc)
+    async with AsyncSession(engine) as session:
+        session.add_all(
+            HandledMessage(
+                message_id=str(index),
+                handler_name="index_topic",
+                created_at=now - timedelta(days=age),
+            )
+            for index, age in enumerate([0, 1, 8, 30])
+        )
+        await session.commit()
+
+    dispatcher.set_handled_retention(timedelta(days=7).total_seconds())
+    dispatcher.start()
+    try:
+
+        async def pruned() -> bool:
+            async with AsyncSession(engine) as session:
+                rows = (await session.exec(select(HandledMessage))).all()
+            return sorted(row.message_id for row in rows) == ["0", "1"]
+
+        await wait_until(pruned)
+    finally:
+        await dispatcher.stop()
+
+
+async def test_one_consumer_reads_a_stream_at_a_time(
+    engine: AsyncEngine, redis: Redis
+) -> None:
+    await redis.xgroup_create(STREAM, "index_topic", id="0", mkstream=True)
+    handled_by: list[int] = []
+    dispatchers = []
+    for index in range(2):
+        dispatcher = create_dispatcher(engine, redis, lease_seconds=0.3)
+
+        async def index_topic(
+            payload: TopicCreated, session: AsyncSession, index: int = index
+        ) -> None:
+            handled_by.append(index)
+
+        dispatcher.register()(index_topic)
+        dispatchers.append(dispatcher)
+
+    async def handled(count: int) -> None:
+        async def done() -> bool:
+            return len(handled_by) == count and await pending(redis) == 0
+
+        await wait_until(done)
+
+    for dispatcher in dispatchers:
+        dispatcher.start()
+    try:
+        # One at a time, so that both would get a share without the lease.
+        for count in range(1, 11):
+            await publish(redis, topic_event(version=1))
+            await handled(count)
+        holder = handled_by[0]
+        assert handled_by == [holder] * 10
+
+        # Once the holder stops, the other process takes over.
+        await dispatchers[holder].stop()
+        await publish(redis, *(topic_event(version=1) for _ in range(5)))
+        await handled(15)
+        assert handled_by[10:] == [1 - holder] * 5
+    finally:
+        for dispatcher in dispatchers:
+            await dispatcher.stop()
+
+
+async def test_takeover_waits_for_the_previous_holder_to_stop(
+    engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Separate clients of one server, so that one holder's Redis can stall.
+    server = FakeServer()
+    redis = FakeAsyncRedis(server=server)
+    await redis.xgroup_create(STREAM, "index_topic", id="0", mkstream=True)
+    topic_id = uuid.uuid4()
+    messages = [
+        topic_event(topic_id=topic_id, version=version, user_id=uuid.uuid4())
+        for version in (1, 2)
+    ]
+    versions = {UUID(m.payload["user_id"]): m.version for m in messages}
+    events: list[tuple[str, str, int | None]] = []
+    started = asyncio.Event()
+
+    first = create_dispatcher(engine, redis, lease_seconds=0.3)
+    first_commands = FakeAsyncRedis(server=server)
+    first.set_command_redis(first_commands)
+    evalsha = first_commands.evalsha
+    stalled = False
+
+    async def stalling_evalsha(*args: Any) -> Any:
+        if stalled:
+            await asyncio.sleep(1)
+        return await evalsha(*args)
+
+    monkeypatch.setattr(first_commands, "evalsha", stalling_evalsha)
+
+    @first.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        version = versions[payload.user_id]
+        events.append(("first", "started", version))
+        started.set()
+        try:
+            # Outlasts the lease.
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            events.append(("first", "cancelled", version))
+            raise
+
+    second = create_dispatcher(engine, redis, lease_seconds=0.3)
+
+    async def handle(payload: TopicCreated, session: AsyncSession) -> None:
+        events.append(("second", "handled", versions[payload.user_id]))
+
+    handle.__name__ = "index_topic"
+    second.register()(handle)
+
+    first.start()
+    try:
+        await publish(redis, messages[0])
+        async with asyncio.timeout(5):
+            await started.wait()
+        # The holder's lease renewals hang, as with a stalled Redis.
+        stalled = True
+        second.start()
+        await publish(redis, messages[1])
+
+        async def both_handled() -> bool:
+            return len(events) == 4 and await pending(redis) == 0
+
+        await wait_until(both_handled)
+    finally:
+        await first.stop()
+        await second.stop()
+
+    # The first holder's handler is stopped before the second can claim its
+    # message, and both versions are then handled once, in order.
+    assert events == [
+        ("first", "started", 1),
+        ("first", "cancelled", 1),
+        ("second", "handled", 1),
+        ("second", "handled", 2),
+    ]
+
+
+async def test_start_rejects_more_readers_than_connections(engine: AsyncEngine) -> None:
+    # Never connects: the pool is checked before any handler starts.
+    redis = Redis(connection_pool=BlockingConnectionPool(max_connections=1))
+    dispatcher = create_dispatcher(engine, redis)
+    dispatcher.set_streams(["a", "b"])
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        dispatcher.start()
+
+
+async def test_replay_after_deletion_is_stale(
+    dispatcher: MessageDispatcher, redis: Redis
+) -> None:
+    handled: list[bool] = []
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        handled.append(True)
+
+    await redis.xgroup_create("backfill", "index_topic", id="0", mkstream=True)
+    dispatcher.set_backfill_streams(["backfill"], 1)
+    topic_id = uuid.uuid4()
+    replay = topic_event(topic_id=topic_id, version=1)
+    replay.replay = True
+
+    async def replay_consumed() -> bool:
+        groups = await redis.xinfo_groups("backfill")
+        last = await redis.xrevrange("backfill", count=1)
+        return groups[0]["last-delivered-id"] == last[0][0] and not groups[0]["pending"]
+
+    dispatcher.start()
+    try:
+        await redis.xadd("backfill", {"data": replay.model_dump_json()})
+        await wait_until(replay_consumed)
+        # Deleted on the live stream while a second backfill is running.
+        await publish(redis, topic_event(TopicDeleted, topic_id, version=2))
+        await wait_until(lambda: consumed(redis))
+        replay.id = str(uuid.uuid4())
+        await redis.xadd("backfill", {"data": replay.model_dump_json()})
+        await wait_until(replay_consumed)
+    finally:
+        await dispatcher.stop()
+
+    assert handled == [True]
+
+
+async def test_wait_raises_once_a_handler_fails(
+    dispatcher: MessageDispatcher, redis: Redis
+) -> None:
+    @dispatcher.register(max_attempts=1)
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        raise RuntimeError("Poison message")
+
+    await publish(redis, topic_event())
+    dispatcher.start()
+    try:
+        with pytest.raises(RuntimeError, match="Poison message"):
+            async with asyncio.timeout(5):
+                await dispatcher.wait()
+    finally:
+        await dispatcher.stop()
+
+    # Left pending for the process that takes over after a restart.
+    assert await pending(redis) == 1
@@ -0,0 +1,48 @@
+import pytest
+
+from digestify_topics.moderation import KeywordAutomaton, Prefilter, Verdict, normalize
+
+
+def test_normalize_folds_obfuscations() -> None:
+    assert normalize("  \uff26\uff52\uff45\uff45\u200b  M0NEY ") == "free money"
+    assert normalize("$p4m") == "spam"
+
+
+def test_keyword_automaton_finds_overlapping_keywords() -> None:
+    automaton = KeywordAutomaton(["he", "she", "hers", "his"])
+
+    assert automaton.search("ushers") == set()
+    assert automaton.search("she said his hers") == {"she", "his", "hers"}
+
+
+def test_keyword_automaton_matches_whole_words_only() -> None:
+    automaton = KeywordAutomaton(["ass", "free money"])
+
+    assert automaton.search("a class on bass") == set()
+    assert automaton.search("get free money now") == {"free money"}
+    assert automaton.search("ass.") == {"ass"}
+    assert automaton.search("free moneys") == set()
+
+
+def test_keyword_automaton_ignores_empty_keywords() -> None:
+    automaton = KeywordAutomaton(["", "  "])
+
+    assert automaton.search("anything") == set()
+
+
+@pytest.mark.parametrize(
+    ("text", "verdict"),
+    [
+        ("A weekly digest of gardening news", Verdict.ALLOWED),
+        ("Buy ch3ap pills here", Verdict.BLOCKED),
+        ("Honest crypto tips", Verdict.AMBIGUOUS),
+        ("Visit https://example.com for more", Verdict.AMBIGUOUS),
+        ("Soooooooo good", Verdict.AMBIGUOUS),
+        ("Hidden\u200bword", Verdict.AMBIGUOUS),
+        ("THIS IS A VERY LOUD TOPIC TITLE", Verdict.AMBIGUOUS),
+    ],
+)
+def test_prefilter(text: str, verdict: Verdict) -> None:
+    prefilter = Prefilter(blocked_terms=["cheap pills"], review_terms=["crypto"])
+
+    assert prefilter.check(text, normalize(text)) == verdict
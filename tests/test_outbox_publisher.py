@@ -0,0 +1,94 @@
+from collections.abc import AsyncIterator
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import col, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics.models import OutboxMessage
+from digestify_topics.outbox_publisher import rotate_outbox_partitions
+
+pytestmark = pytest.mark.postgres
+
+
+async def partitions(engine: AsyncEngine) -> dict[str, list[str] | None]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text(
+                "SELECT c.relname, c.reloptions FROM pg_inherits i"
+                " JOIN pg_class c ON c.oid = i.inhrelid"
+                " WHERE i.inhparent = 'outbox_messages'::regclass"
+            )
+        )
+        return {name: options for name, options in result.tuples()}
+
+
+@pytest.fixture
+async def engine(postgres_engine: AsyncEngine) -> AsyncIterator[AsyncEngine]:
+    yield postgres_engine
+    async with postgres_engine.begin() as connection:
+        for name in await partitions(postgres_engine):
+            if name != "outbox_messages_default":
+                await connection.execute(text(f"DROP TABLE {name}"))
+
+
+async def insert_messages(engine: AsyncEngine, count: int) -> None:
+    async with AsyncSession(engine) as session:
+        session.add_all(
+            OutboxMessage(type="TopicCreated", payload={}) for _ in range(count)
+        )
+        await session.commit()
+
+
+async def test_partitions_are_created_ahead_of_the_sequence(
+    engine: AsyncEngine,
+) -> None:
+    await rotate_outbox_partitions(engine, size=10)
+
+    created = await partitions(engine)
+    assert sorted(created) == [
+        "outbox_messages_10_20",
+        "outbox_messages_20_30",
+        "outbox_messages_default",
+    ]
+    # The migrations' storage parameters are copied to every partition.
+    options = created["outbox_messages_default"]
+    assert options
+    assert all(value == options for value in created.values())
+
+    await insert_messages(engine, 25)
+    await rotate_outbox_partitions(engine, size=10)
+
+    assert sorted(await partitions(engine)) == [
+        "outbox_messages_10_20",
+        "outbox_messages_20_30",
+        "outbox_messages_30_40",
+        "outbox_messages_40_50",
+        "outbox_messages_default",
+    ]
+
+
+async def test_partitions_are_dropped_once_published(engine: AsyncEngine) -> None:
+    await rotate_outbox_partitions(engine, size=10)
+    await insert_messages(engine, 25)
+
+    # Fully allocated, but rows are left to publish.
+    await rotate_outbox_partitions(engine, size=10)
+    assert "outbox_messages_10_20" in await partitions(engine)
+
+    async with AsyncSession(engine) as session:
+        await session.execute(
+            delete(OutboxMessage).where(col(OutboxMessage.sequence) < 20)
+        )
+        await session.commit()
+    await rotate_outbox_partitions(engine, size=10)
+
+    remaining = await partitions(engine)
+    assert "outbox_messages_10_20" not in remaining
+    # Its range is still being allocated.
+    assert "outbox_messages_20_30" in remaining
+    async with engine.connect() as connection:
+        assert (
+            await connection.scalar(text("SELECT count(*) FROM outbox_messages")) == 6
+        )
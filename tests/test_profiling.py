@@ -0,0 +1,174 @@
+import threading
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from digestify_topics import auth, profiling, settings
+from digestify_topics.app import create_app
+from digestify_topics.settings import Settings
+
+ADMIN_ID = uuid.uuid4()
+USER_ID = uuid.uuid4()
+
+
+def sql_hooks_installed() -> bool:
+    return event.contains(
+        Engine, "before_cursor_execute", profiling._before_cursor_execute
+    ) or event.contains(Engine, "after_cursor_execute", profiling._after_cursor_execute)
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    # A bearer token is the ID of the user it authenticates.
+    def verify_jwt_token(token: str) -> dict:
+        return {"sub": token}
+
+    monkeypatch.setattr(auth, "verify_jwt_token", verify_jwt_token)
+    monkeypatch.setattr(profiling, "verify_jwt_token", verify_jwt_token)
+    monkeypatch.setattr(profiling, "_profile_store", None)
+    yield
+    if sql_hooks_installed():
+        event.remove(Engine, "before_cursor_execute", profiling._before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", profiling._after_cursor_execute)
+
+
+@asynccontextmanager
+async def serve(
+    monkeypatch: pytest.MonkeyPatch, **overrides: Any
+) -> AsyncIterator[AsyncClient]:
+    monkeypatch.setattr(
+        settings,
+        "_settings",
+        Settings.model_construct(
+            debug=False,
+            rate_limit_enabled=False,
+            admin_user_ids=[ADMIN_ID],
+            **overrides,
+        ),
+    )
+    app = create_app()
+
+    @app.get("/work")
+    async def work() -> None:
+        pass
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+def as_user(user_id: uuid.UUID, profile: bool = False) -> dict[str, str]:
+    headers = {"Authorization": f"Bearer {user_id}"}
+    if profile:
+        headers["X-Profile"] = "1"
+    return headers
+
+
+def routes(app: FastAPI) -> list[str]:
+    return [getattr(route, "path", "") for route in app.routes]
+
+
+async def test_profiling_is_off_by_default(monkeypatch: pytest.MonkeyPatch) -> None:
+    threads = threading.active_count()
+
+    async with serve(monkeypatch) as client:
+        response = await client.get("/work", headers=as_user(ADMIN_ID, profile=True))
+        listing = await client.get("/debug/profiles", headers=as_user(ADMIN_ID))
+
+    assert Settings.model_fields["profiling_enabled"].default is False
+    assert "X-Profile-ID" not in response.headers
+    assert listing.status_code == 404
+    # Neither the SQL hooks nor the sampler thread are set up.
+    assert not sql_hooks_installed()
+    assert profiling._sampler._thread is None
+    assert threading.active_count() == threads
+
+
+def test_disabled_app_has_no_profiling(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "_settings", Settings.model_construct(debug=False))
+    app = create_app()
+
+    assert not any(route.startswith("/debug") for route in routes(app))
+    assert not any(
+        middleware.cls is profiling.ProfilingMiddleware
+        for middleware in app.user_middleware
+    )
+
+
+async def test_requested_profiles_are_kept(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with serve(monkeypatch, profiling_enabled=True) as client:
+        response = await client.get("/work", headers=as_user(ADMIN_ID, profile=True))
+        profile_id = response.headers["X-Profile-ID"]
+        profile = await client.get(
+            f"/debug/profiles/{profile_id}", headers=as_user(ADMIN_ID)
+        )
+
+    assert sql_hooks_installed()
+    assert profile.status_code == 200
+    assert profile.json()["route"] == "/work"
+    assert profile.json()["requested"]
+
+
+async def test_only_slow_sampled_requests_are_kept_up_to_the_buffer_size(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async with serve(
+        monkeypatch,
+        profiling_enabled=True,
+        profiling_sample_rate=1,
+        profiling_slow_seconds=0,
+        profiling_buffer_size=2,
+    ) as client:
+        request_ids = [uuid.uuid4().hex for _ in range(3)]
+        for request_id in request_ids:
+            await client.get("/work", headers={"X-Request-ID": request_id})
+        response = await client.get("/debug/profiles", headers=as_user(ADMIN_ID))
+
+    # Newest first, and the oldest was dropped. The listing's own profile is
+    # only added once it has responded.
+    assert [(profile["id"], profile["requested"]) for profile in response.json()] == [
+        (request_ids[2], False),
+        (request_ids[1], False),
+    ]
+
+    monkeypatch.setattr(profiling, "_profile_store", None)
+    async with serve(
+        monkeypatch,
+        profiling_enabled=True,
+        profiling_sample_rate=1,
+        profiling_slow_seconds=60,
+    ) as client:
+        await client.get("/work")
+        response = await client.get("/debug/profiles", headers=as_user(ADMIN_ID))
+
+    # Fast ones are sampled but not kept.
+    assert response.json() == []
+
+
+async def test_profiles_are_for_admins_only(monkeypatch: pytest.MonkeyPatch) -> None:
+    async with serve(monkeypatch, profiling_enabled=True) as client:
+        response = await client.get("/work", headers=as_user(ADMIN_ID, profile=True))
+        profile_id = response.headers["X-Profile-ID"]
+
+        for path in [
+            "/debug/profiles",
+            f"/debug/profiles/{profile_id}",
+            f"/debug/profiles/{profile_id}/folded",
+        ]:
+            assert (
+                await client.get(path, headers=as_user(ADMIN_ID))
+            ).status_code == 200
+            assert (await client.get(path, headers=as_user(USER_ID))).status_code == 403
+            assert (await client.get(path)).status_code in (401, 403)
+
+        # Asking for a profile is ignored for anyone else.
+        response = await client.get("/work", headers=as_user(USER_ID, profile=True))
+        assert "X-Profile-ID" not in response.headers
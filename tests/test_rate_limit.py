@@ -0,0 +1,56 @@
+import pytest
+from redis.asyncio import Redis
+
+from digestify_topics import rate_limit
+from digestify_topics.rate_limit import TOKEN_BUCKET_SCRIPT, LocalTokenBuckets
+from digestify_topics.settings import RateLimit
+
+LIMIT = RateLimit(capacity=2, refill_per_second=0.5)
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_local_buckets_refill_over_time(clock: list[float]) -> None:
+    buckets = LocalTokenBuckets()
+
+    assert buckets.take("a", LIMIT) == 0
+    assert buckets.take("a", LIMIT) == 0
+    assert buckets.take("a", LIMIT) == pytest.approx(2)
+    clock[0] += 1
+    assert buckets.take("a", LIMIT) == pytest.approx(1)
+    clock[0] += 1
+    assert buckets.take("a", LIMIT) == 0
+    # Idle buckets refill up to their capacity only.
+    clock[0] += 100
+    assert buckets.take("a", LIMIT) == 0
+    assert buckets.take("a", LIMIT) == 0
+    assert buckets.take("a", LIMIT) > 0
+
+
+def test_local_buckets_are_per_key_and_bounded(clock: list[float]) -> None:
+    buckets = LocalTokenBuckets(max_size=2)
+    buckets.take("a", LIMIT)
+    buckets.take("a", LIMIT)
+    assert buckets.take("b", LIMIT) == 0
+
+    # A third key evicts the least recently used one, which starts over.
+    buckets.take("c", LIMIT)
+    assert buckets.take("a", LIMIT) == 0
+
+
+async def test_token_bucket_script(redis: Redis) -> None:
+    script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+    args = [LIMIT.capacity, LIMIT.refill_per_second]
+
+    assert await script(keys=["bucket"], args=args) == [1, 0]
+    assert await script(keys=["bucket"], args=args) == [1, 0]
+    allowed, retry_after_ms = await script(keys=["bucket"], args=args)
+    assert allowed == 0
+    assert 0 < retry_after_ms <= 2000
+    assert await script(keys=["other"], args=args) == [1, 0]
+    assert 0 < await redis.pttl("bucket") <= 5000
@@ -0,0 +1,79 @@
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from digestify_topics import db, settings, stream
+from digestify_topics.read_session import get_read_engine_for, mark_recent_write
+from digestify_topics.settings import Settings
+from digestify_topics.stream import RedisRole
+
+
+@pytest.fixture(autouse=True)
+def environment(redis: Redis, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(
+        settings, "_settings", Settings.model_construct(read_your_writes_seconds=5)
+    )
+    monkeypatch.setattr(stream, "_redis", {RedisRole.CACHE: redis})
+
+
+@pytest.fixture
+async def replica(
+    engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[AsyncEngine]:
+    # Never connected to: only the engine a read is routed to matters.
+    replica = create_async_engine("sqlite+aiosqlite://")
+    monkeypatch.setattr(db, "_engine", engine)
+    monkeypatch.setattr(db, "_read_engine", replica)
+    yield replica
+    await replica.dispose()
+
+
+async def test_reads_use_the_primary_without_a_replica(
+    engine: AsyncEngine, redis: Redis, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(db, "_engine", engine)
+    user_id = uuid.uuid4()
+
+    await mark_recent_write(user_id)
+
+    assert await get_read_engine_for(user_id) is engine
+    # Nothing to wait for, so nothing is recorded.
+    assert await redis.keys() == []
+
+
+async def test_reads_use_the_replica_until_the_user_writes(
+    engine: AsyncEngine, replica: AsyncEngine, redis: Redis
+) -> None:
+    user_id, other_user_id = uuid.uuid4(), uuid.uuid4()
+    assert await get_read_engine_for(user_id) is replica
+
+    await mark_recent_write(user_id)
+
+    assert await get_read_engine_for(user_id) is engine
+    assert await get_read_engine_for(other_user_id) is replica
+    assert 0 < await redis.ttl(f"recent_write:{user_id}") <= 5
+
+
+async def test_reads_use_the_primary_when_redis_fails(
+    engine: AsyncEngine,
+    replica: AsyncEngine,
+    redis: Redis,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def fail(*args: Any, **kwargs: Any) -> Any:
+        raise RedisError("Connection lost")
+
+    monkeypatch.setattr(redis, "set", fail)
+    monkeypatch.setattr(redis, "exists", fail)
+    user_id = uuid.uuid4()
+
+    # A write that could not be recorded does not fail the request.
+    await mark_recent_write(user_id)
+
+    # Whether the user has just written is unknown, so the replica is avoided.
+    assert await get_read_engine_for(user_id) is engine
@@ -0,0 +1,324 @@
+import json
+import uuid
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics import db, settings
+from digestify_topics.auth import Auth, get_auth
+from digestify_topics.db import get_session
+from digestify_topics.models import OutboxMessage, Topic, User
+from digestify_topics.queries import HTTPQueries, MockQueries, Queries
+from digestify_topics.read_session import get_read_session
+from digestify_topics.router import _decode_cursor, _encode_cursor, router
+from digestify_topics.settings import Settings
+
+USER_ID = uuid.uuid4()
+
+
+@asynccontextmanager
+async def serve(
+    engine: AsyncEngine,
+    monkeypatch: pytest.MonkeyPatch,
+    queries: type[Queries] = MockQueries,
+) -> AsyncIterator[AsyncClient]:
+    # Without a replica, reads and writes share the engine and no recent
+    # writes are recorded in Redis.
+    monkeypatch.setattr(db, "_engine", engine)
+    monkeypatch.setattr(
+        settings, "_settings", Settings.model_construct(rate_limit_enabled=False)
+    )
+
+    async def session() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_auth] = lambda: Auth(id=USER_ID, is_anonymous=False)
+    app.dependency_overrides[get_session] = session
+    app.dependency_overrides[get_read_session] = session
+    app.dependency_overrides[HTTPQueries] = queries
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        yield client
+
+
+@pytest.fixture
+async def client(
+    engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[AsyncClient]:
+    async with serve(engine, monkeypatch) as client:
+        yield client
+
+
+@pytest.fixture
+async def postgres_client(
+    postgres_engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> AsyncIterator[AsyncClient]:
+    async with serve(postgres_engine, monkeypatch) as client:
+        yield client
+
+
+async def test_create_my_user(client: AsyncClient) -> None:
+    response = await client.post("/me")
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(USER_ID)
+    assert response.json()["created_topic_count"] == 0
+    assert (await client.get("/me")).json() == response.json()
+    assert (await client.post("/me")).status_code == 400
+
+
+async def test_export_my_topics(client: AsyncClient, engine: AsyncEngine) -> None:
+    assert (await client.get("/my_topics/export")).status_code == 404
+
+    await client.post("/me")
+    topics = [
+        Topic(
+            name=name,
+            description="",
+            user_id=user_id,
+            is_public=True,
+            locale="en",
+            discarded=discarded,
+        )
+        for name, user_id, discarded in [
+            ("mine", USER_ID, False),
+            ("deleted", USER_ID, True),
+            ("theirs", uuid.uuid4(), False),
+        ]
+    ]
+    async with AsyncSession(engine) as session:
+        session.add_all(topics)
+        await session.commit()
+    response = await client.get("/my_topics/export")
+
+    assert response.status_code == 200
+    assert [line["name"] for line in map(json.loads, response.text.splitlines())] == [
+        "mine"
+    ]
+
+
+async def create_topic(client: AsyncClient, name: str = "Gardening") -> dict:
+    response = await client.post(
+        "/topics",
+        params={
+            "name": name,
+            "description": "Weekly news",
+            "is_public": True,
+            "locale": "en",
+            "image_uri": None,
+        },
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+async def test_create_topic(client: AsyncClient) -> None:
+    await client.post("/me")
+    topic = await create_topic(client)
+
+    # Stamped by the database in one statement.
+    assert topic["created_at"] == topic["updated_at"]
+    assert (await client.get("/my_topics")).json() == {"topics": [topic]}
+
+
+async def test_create_topic_checks_before_locking_the_user(
+    engine: AsyncEngine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = []
+    event.listen(engine.sync_engine, "begin", lambda connection: calls.append("begin"))
+
+    class RecordingQueries(MockQueries):
+        async def check_user_subscription(self, user_id: uuid.UUID) -> bool:
+            calls.append("subscription")
+            return True
+
+        async def validate_topic_creation(self, name: str, description: str) -> bool:
+            calls.append("validation")
+            return True
+
+    async with serve(engine, monkeypatch, RecordingQueries) as client:
+        await client.post("/me")
+        calls.clear()
+        await create_topic(client)
+
+    assert calls[:3] == ["subscription", "validation", "begin"]
+
+
+async def snapshot(engine: AsyncEngine) -> tuple[list, list, list]:
+    async with AsyncSession(engine) as session:
+        topics = (await session.exec(select(Topic).order_by(Topic.name))).all()
+        users = (await session.exec(select(User))).all()
+        messages = (await session.exec(select(OutboxMessage))).all()
+        return (
+            [topic.model_dump() for topic in topics],
+            [user.model_dump() for user in users],
+            [message.model_dump() for message in messages],
+        )
+
+
+@pytest.mark.postgres
+async def test_delete_topic(
+    postgres_client: AsyncClient, postgres_engine: AsyncEngine
+) -> None:
+    client, engine = postgres_client, postgres_engine
+    await client.post("/me")
+    topic = await create_topic(client)
+    theirs = Topic(
+        name="Theirs", description="", user_id=uuid.uuid4(), is_public=True, locale="en"
+    )
+    theirs_id = theirs.id
+    async with AsyncSession(engine) as session:
+        session.add(theirs)
+        await session.commit()
+        await session.execute(delete(OutboxMessage))
+        await session.commit()
+    before = await snapshot(engine)
+
+    # Nothing is written for a missing topic or someone else's.
+    assert (await client.delete(f"/topics/{uuid.uuid4()}")).status_code == 404
+    assert (await client.delete(f"/topics/{theirs_id}")).status_code == 404
+    assert await snapshot(engine) == before
+
+    assert (await client.delete(f"/topics/{topic['id']}")).status_code == 204
+    topics, users, messages = await snapshot(engine)
+    # The topic, its owner and the outbox message, all in one statement.
+    assert topics[0]["discarded"]
+    assert topics[0]["version"] == before[0][0]["version"] + 1
+    assert topics[1] == before[0][1]
+    assert users[0]["created_topic_count"] == before[1][0]["created_topic_count"] - 1
+    assert users[0]["version"] == before[1][0]["version"] + 1
+    assert users[0]["updated_at"] == topics[0]["updated_at"]
+    assert [
+        (message["type"], message["entity"], message["version"], message["payload"])
+        for message in messages
+    ] == [
+        (
+            "TopicDeleted",
+            f"topic:{topic['id']}",
+            topics[0]["version"],
+            {"topic_id": topic["id"], "user_id": str(USER_ID)},
+        )
+    ]
+
+    # Deleting it again changes nothing, the counter included.
+    after = await snapshot(engine)
+    assert (await client.delete(f"/topics/{topic['id']}")).status_code == 404
+    assert await snapshot(engine) == after
+
+
+async def add_topics(
+    engine: AsyncEngine, ages: list[float], discarded: bool = False
+) -> list[uuid.UUID]:
+    # Stamped by the database's clock, which the settle window is counted on.
+    async with AsyncSession(engine) as session:
+        now = await session.scalar(text("SELECT clock_timestamp()"))
+        topics = [
+            Topic(
+                name=f"Topic {age}",
+                description="",
+                user_id=USER_ID,
+                is_public=True,
+                locale="en",
+                discarded=discarded,
+                updated_at=now - timedelta(seconds=age),
+            )
+            for age in ages
+        ]
+        session.add_all(topics)
+        ids = [topic.id for topic in topics]
+        await session.commit()
+    return ids
+
+
+async def read_changes(client: AsyncClient, limit: int) -> list[dict]:
+    pages = []
+    params: dict = {"limit": limit}
+    while True:
+        page = (await client.get("/topics/changes", params=params)).json()
+        pages.append(page)
+        if not page["has_more"]:
+            return pages
+        params["cursor"] = page["cursor"]
+
+
+@pytest.mark.postgres
+async def test_topic_changes_are_paged(
+    postgres_client: AsyncClient, postgres_engine: AsyncEngine
+) -> None:
+    live = await add_topics(postgres_engine, [50, 30, 10])
+    deleted = await add_topics(postgres_engine, [40, 20], discarded=True)
+
+    pages = await read_changes(postgres_client, limit=2)
+
+    assert [
+        ([topic["id"] for topic in page["topics"]], page["deleted_topic_ids"])
+        for page in pages
+    ] == [
+        ([str(live[0])], [str(deleted[0])]),
+        ([str(live[1])], [str(deleted[1])]),
+        ([str(live[2])], []),
+    ]
+    assert [page["has_more"] for page in pages] == [True, True, False]
+
+
+@pytest.mark.postgres
+async def test_topic_changes_break_ties_by_id(
+    postgres_client: AsyncClient, postgres_engine: AsyncEngine
+) -> None:
+    ids = await add_topics(postgres_engine, [30, 30, 30])
+
+    pages = await read_changes(postgres_client, limit=1)
+
+    # None is skipped or repeated, though they share one updated_at.
+    assert [topic["id"] for page in pages for topic in page["topics"]] == sorted(
+        map(str, ids)
+    )
+
+
+@pytest.mark.postgres
+async def test_topic_changes_wait_for_the_settle_window(
+    postgres_client: AsyncClient, postgres_engine: AsyncEngine
+) -> None:
+    settled = await add_topics(postgres_engine, [10])
+    await add_topics(postgres_engine, [1])
+
+    page = (await postgres_client.get("/topics/changes")).json()
+
+    # The newer change may still have writes in flight before it, so the
+    # cursor stops short of it.
+    assert [topic["id"] for topic in page["topics"]] == [str(settled[0])]
+    assert not page["has_more"]
+    page = (
+        await postgres_client.get("/topics/changes", params={"cursor": page["cursor"]})
+    ).json()
+    assert page["topics"] == []
+
+
+def test_cursor_round_trip() -> None:
+    updated_at = datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc)
+    topic_id = uuid.uuid4()
+
+    assert _decode_cursor(_encode_cursor(updated_at, topic_id)) == (
+        updated_at,
+        topic_id,
+    )
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8gc2VwYXJhdG9y", "YXxi"])
+def test_invalid_cursor(cursor: str) -> None:
+    with pytest.raises(HTTPException) as error:
+        _decode_cursor(cursor)
+
+    assert error.value.status_code == 400
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeAsyncRedisConnection
+from prometheus_client import REGISTRY
+
+from digestify_topics.settings import Settings
+from digestify_topics.stream import (
+    STREAM,
+    RedisRole,
+    TimedConnectionPool,
+    consumer_streams,
+    create_redis,
+    shard_index,
+    stream_shards,
+)
+
+
+def settings(
+    shard_count: int = 1,
+    assignment: list[int] | None = None,
+    previous_shard_count: int | None = None,
+) -> Settings:
+    return Settings.model_construct(
+        stream_shard_count=shard_count,
+        stream_shard_assignment=assignment,
+        stream_previous_shard_count=previous_shard_count,
+    )
+
+
+def test_stream_shards() -> None:
+    assert stream_shards(STREAM, 1) == [STREAM]
+    assert stream_shards(STREAM, 3) == [
+        f"{STREAM}:{{0}}",
+        f"{STREAM}:{{1}}",
+        f"{STREAM}:{{2}}",
+    ]
+
+
+def test_shard_index_is_stable_and_in_range() -> None:
+    keys = [f"topic:{index}" for index in range(1000)]
+    indexes = [shard_index(key, 4) for key in keys]
+
+    assert indexes == [shard_index(key, 4) for key in keys]
+    assert set(indexes) == {0, 1, 2, 3}
+    # The same CRC16 as Redis Cluster, where CLUSTER KEYSLOT foo is 12182.
+    assert shard_index("foo", 16384) == 12182
+    assert shard_index("topic:1", 1) == 0
+
+
+def test_consumer_streams_split_shards_between_processes() -> None:
+    shards = stream_shards(STREAM, 4)
+
+    assert consumer_streams(settings(4)) == shards
+    assert consumer_streams(settings(4), 0, 2) == [shards[0], shards[2]]
+    assert consumer_streams(settings(4), 1, 2) == [shards[1], shards[3]]
+    assert consumer_streams(settings(4, assignment=[1, 3]), 1, 2) == [shards[3]]
+
+
+def test_consumer_streams_drain_the_previous_layout() -> None:
+    streams = consumer_streams(settings(2, previous_shard_count=1), 1, 2)
+
+    assert streams == [stream_shards(STREAM, 2)[1], STREAM]
+
+
+def test_consumer_streams_reject_more_processes_than_shards() -> None:
+    with pytest.raises(ValueError):
+        consumer_streams(settings(1), 0, 4)
+    with pytest.raises(ValueError):
+        consumer_streams(settings(4, assignment=[0]), 0, 2)
+
+
+async def test_each_role_gets_its_own_pool() -> None:
+    settings = Settings.model_construct(
+        redis_host="localhost",
+        redis_port=6379,
+        redis_password="",
+        redis_consumer_max_connections=20,
+        redis_command_max_connections=10,
+        redis_publisher_max_connections=5,
+        redis_cache_max_connections=15,
+        redis_pool_timeout=2,
+        redis_socket_timeout=1,
+        redis_health_check_interval=30,
+        redis_retries=3,
+    )
+    # Creating a client does not connect.
+    clients = {role: create_redis(settings, role) for role in RedisRole}
+    pools = {role: client.connection_pool for role, client in clients.items()}
+
+    assert len({id(pool) for pool in pools.values()}) == len(RedisRole)
+    assert {role: pool.max_connections for role, pool in pools.items()} == {
+        RedisRole.CONSUMER: 20,
+        RedisRole.COMMAND: 10,
+        RedisRole.PUBLISHER: 5,
+        RedisRole.CACHE: 15,
+    }
+    for pool in pools.values():
+        assert isinstance(pool, TimedConnectionPool)
+        assert pool.timeout == 2
+
+
+def wait_seconds(role: RedisRole) -> tuple[float, float]:
+    labels = {"role": role.value}
+    return (
+        REGISTRY.get_sample_value("redis_pool_wait_seconds_count", labels) or 0,
+        REGISTRY.get_sample_value("redis_pool_wait_seconds_sum", labels) or 0,
+    )
+
+
+async def test_pool_records_checkout_wait() -> None:
+    pool = TimedConnectionPool(
+        role=RedisRole.CACHE,
+        connection_class=FakeAsyncRedisConnection,
+        server=FakeServer(),
+        max_connections=1,
+        timeout=5,
+    )
+    count, total = wait_seconds(RedisRole.CACHE)
+    connection = await pool.get_connection()
+
+    async def release_later() -> None:
+        await asyncio.sleep(0.1)
+        await pool.release(connection)
+
+    # The second checkout waits until the only connection is released.
+    release = asyncio.create_task(release_later())
+    await pool.get_connection()
+    await release
+    await pool.disconnect()
+
+    new_count, new_total = wait_seconds(RedisRole.CACHE)
+    assert new_count == count + 2
+    assert new_total - total >= 0.1
@@ -0,0 +1,85 @@
+import asyncio
+import uuid
+from collections.abc import Iterator
+
+import pytest
+from redis.asyncio import Redis
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from digestify_topics.message_dispatcher import MessageDispatcher
+from digestify_topics.messages import TopicCreated
+from digestify_topics.models import OutboxMessage
+from digestify_topics.outbox_publisher import OutboxPublisher
+from digestify_topics.tracing import (
+    InMemorySpanExporter,
+    get_span_exporter,
+    set_request_id,
+    set_span_exporter,
+)
+
+
+@pytest.fixture
+def exporter() -> Iterator[InMemorySpanExporter]:
+    previous = get_span_exporter()
+    exporter = InMemorySpanExporter()
+    set_span_exporter(exporter)
+    yield exporter
+    set_span_exporter(previous)
+
+
+async def test_spans_follow_a_message_from_outbox_to_ack(
+    engine: AsyncEngine, redis: Redis, exporter: InMemorySpanExporter
+) -> None:
+    dispatcher = MessageDispatcher(stream="test")
+
+    @dispatcher.register()
+    async def index_topic(payload: TopicCreated, session: AsyncSession) -> None:
+        pass
+
+    dispatcher.set_redis(redis)
+    dispatcher.set_engine(engine)
+    await redis.xgroup_create("test", "index_topic", id="0", mkstream=True)
+
+    topic_id = uuid.uuid4()
+    set_request_id("request-1")
+    message = OutboxMessage.from_payload(
+        TopicCreated(topic_id=topic_id, user_id=uuid.uuid4()),
+        version=1,
+        entity=f"topic:{topic_id}",
+    )
+    set_request_id(None)
+    trace_id = str(message.id)
+    async with AsyncSession(engine) as session:
+        session.add(message)
+        await session.commit()
+
+    publisher = OutboxPublisher(engine, redis, "test")
+    publisher.start()
+    dispatcher.start()
+    try:
+        async with asyncio.timeout(5):
+            while not any(s.name == "end_to_end" for s in exporter.spans):
+                await asyncio.sleep(0.01)
+    finally:
+        await publisher.stop()
+        await dispatcher.stop()
+
+    assert [s.name for s in exporter.spans if s.trace_id == trace_id] == [
+        "outbox_wait",
+        "publish",
+        "stream_wait",
+        "handler",
+        "commit",
+        "ack",
+        "end_to_end",
+    ]
+    handled = next(s for s in exporter.spans if s.name == "end_to_end")
+    assert handled.attributes["handler"] == "index_topic"
+    assert handled.attributes["request_id"] == "request-1"
+    assert await redis.xpending("test", "index_topic") == {
+        "pending": 0,
+        "min": None,
+        "max": None,
+        "consumers": [],
+    }